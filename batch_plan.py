@@ -0,0 +1,319 @@
+"""
+Meal plans for a whole cohort of users at once.
+
+Reads user profiles (name, age, weight, height, gender, goal) from a CSV or
+JSONL file and writes one JSON plan per line. Requirements are computed for
+every user in one vectorized pass, and each meal slot is filled for the
+whole cohort in lockstep with `MealIndex.select_many`, using the same rules
+as meal_plan.generate_meal_plan. The cohort is processed in fixed-size
+chunks, each with its own seed derived from --seed, so the output is the
+same with or without --processes.
+
+With --days N each user gets N days at once from multi_day.MultiDayPlanner,
+with no menu item repeated within --item-gap days and at most
+--per-restaurant meals per restaurant per day.
+
+    python batch_plan.py profiles.csv --output plans.jsonl --seed 42 --processes 4
+    python batch_plan.py profiles.csv --days 30 --item-gap 7 --per-restaurant 1
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from catalogue import PLAN_COLUMNS, load_catalogue
+from meal_index import MealIndex
+from meal_rules import MEAL_SLOTS, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, SNACK_SLOTS, SNACK_UNTIL
+
+GOALS = {1: 'gain muscle', 2: 'lose weight', 3: 'maintain weight'}
+PROFILE_COLUMNS = ['age', 'weight', 'height', 'gender', 'goal']
+# Upper bounds on age (years), weight (kg) and height (cm); anything above is a typo, not a person
+PROFILE_LIMITS = {'age': 120, 'weight': 500, 'height': 300}
+
+# Set per process by _load_index
+_index = None
+
+
+def read_profiles(path):
+    """
+    Read a CSV or JSONL (.jsonl/.ndjson) file of user profiles. `goal` may
+    be the menu number from meal_plan.py (1-3) or the goal itself.
+    """
+    if path.endswith(('.jsonl', '.ndjson')):
+        profiles = pd.read_json(path, lines=True, dtype=False)
+    else:
+        profiles = pd.read_csv(path)
+    missing = [column for column in PROFILE_COLUMNS if column not in profiles]
+    if missing:
+        raise ValueError(f"{path} is missing profile columns: {', '.join(missing)}")
+    if 'name' not in profiles:
+        profiles['name'] = profiles.index.astype(str)
+    return profiles
+
+
+def normalize_profiles(profiles):
+    """
+    Coerce profile columns to numbers and lowercase strings, and return
+    them with a mask of the rows that are valid (the same checks as the
+    prompts in meal_plan.main).
+    """
+    profiles = profiles.copy()
+    for column in ['age', 'weight', 'height']:
+        profiles[column] = pd.to_numeric(profiles[column], errors='coerce')
+    profiles['gender'] = profiles['gender'].astype(str).str.strip().str.lower()
+
+    # A blank cell makes pandas read the whole column as float, so codes are matched as numbers, not as '1'
+    code = pd.to_numeric(profiles['goal'], errors='coerce')
+    text = profiles['goal'].astype(str).str.strip().str.lower()
+    profiles['goal'] = code.map(GOALS).where(code.notna(), text)
+
+    # Bounded numbers keep the requirements finite, so every plan line is valid JSON
+    valid = (
+        pd.concat([profiles[column].between(0, limit, inclusive='right')
+                   for column, limit in PROFILE_LIMITS.items()], axis=1).all(axis=1) &
+        profiles['gender'].isin(['male', 'female']) &
+        profiles['goal'].isin(GOALS.values())
+    )
+    return profiles, valid.to_numpy()
+
+
+def calculate_requirements_batch(weight, height, age, gender, goal):
+    """
+    Vectorized meal_plan.calculate_requirements.
+
+    Args:
+    weight (np.ndarray): Weights in kg
+    height (np.ndarray): Heights in cm
+    age (np.ndarray): Ages in years
+    gender (np.ndarray): 'male' or 'female' per user
+    goal (np.ndarray): 'gain muscle', 'lose weight' or 'maintain weight' per user
+
+    Returns:
+    tuple: (total_calories, protein_requirement) arrays
+    """
+    # Mifflin-St Jeor BMR, moderate activity (1.55) and a 500 calorie surplus/deficit per goal
+    bmr = 10 * weight + 6.25 * height - 5 * age + np.where(gender == 'male', 5, -161)
+    tdee = bmr * 1.55
+    total_calories = tdee + np.select([goal == 'gain muscle', goal == 'lose weight'], [500, -500], 0)
+    protein_requirement = weight * 2.0
+    return total_calories, protein_requirement
+
+
+def _pick(index, remaining, min_calories, min_protein, rng):
+    picks = index.select_many(remaining, min_calories, min_protein, rng)
+
+    # Relax the protein requirement for users with no qualifying meal, as select_meal does
+    missing = np.flatnonzero(picks < 0)
+    if len(missing):
+        picks[missing] = index.select_many(remaining[missing], rng=rng)
+    return picks
+
+
+def plan_cohort(total_calories, index, rng=None):
+    """
+    Fill every meal slot for a whole cohort in lockstep.
+
+    Args:
+    total_calories (np.ndarray): Calorie target per user
+    index (MealIndex): Index to select from
+    rng (np.random.Generator): Random generator, for reproducible plans
+
+    Returns:
+    tuple: (picks, total_calories_consumed, total_protein_consumed), where
+    picks is an (users, slots) array of catalogue row positions, -1 for an
+    empty slot. Slots are breakfast, lunch, dinner and then the snacks.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    users = len(total_calories)
+    picks = np.full((users, len(MEAL_SLOTS) + SNACK_SLOTS), -1, dtype=np.int64)
+    calories_consumed = np.zeros(users)
+    protein_consumed = np.zeros(users)
+
+    def take(slot, users_in_slot, chosen):
+        found = chosen >= 0
+        users_in_slot, chosen = users_in_slot[found], chosen[found]
+        picks[users_in_slot, slot] = chosen
+        calories_consumed[users_in_slot] += index.calories[chosen]
+        protein_consumed[users_in_slot] += index.protein[chosen]
+        return found
+
+    everyone = np.arange(users)
+    for slot, (_, min_calories, min_protein) in enumerate(MEAL_SLOTS):
+        remaining = total_calories - calories_consumed
+        take(slot, everyone, _pick(index, remaining, np.minimum(min_calories, remaining), min_protein, rng))
+
+    # Snacks go to users still under 90% of their target; a user without a fitting snack gets no more
+    snacking = everyone
+    for slot in range(len(MEAL_SLOTS), len(MEAL_SLOTS) + SNACK_SLOTS):
+        snacking = snacking[calories_consumed[snacking] < total_calories[snacking] * SNACK_UNTIL]
+        remaining = total_calories[snacking] - calories_consumed[snacking]
+        found = take(slot, snacking, _pick(index, remaining, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, rng))
+        snacking = snacking[found]
+
+    return picks, calories_consumed, protein_consumed
+
+
+def _load_index(catalogue_path):
+    global _index
+    _index = MealIndex(load_catalogue(catalogue_path, PLAN_COLUMNS).reset_index(drop=True))
+    # one pre-serialized JSON object per catalogue item, shared by every plan that picks it
+    meal_data = _index.meal_data
+    _index.item_json = [
+        json.dumps({'Restaurant Name': str(restaurant), 'Menu Item': str(item), 'Link': None if pd.isna(link) else str(link),
+                    'Calories': float(calories), 'Protein (g)': float(protein)}, ensure_ascii=False)
+        for restaurant, item, link, calories, protein in zip(
+            meal_data['Restaurant Name'], meal_data['Menu Item'], meal_data['Link'], _index.calories, _index.protein)
+    ]
+
+
+def _day_json(item_json, slot_names, picks):
+    meals = [f'"{slot}": [{item_json[pick]}]' if pick >= 0 else f'"{slot}": []'
+             for slot, pick in zip(slot_names, picks)]
+    snacks = ', '.join(item_json[pick] for pick in picks[len(MEAL_SLOTS):] if pick >= 0)
+    return f'{{{", ".join(meals)}, "snacks": [{snacks}]}}'
+
+
+def plan_lines(profiles, seed_sequence, index=None, variety=None):
+    """
+    Plan a chunk of normalized, valid profiles and return one JSON line per
+    user, in input order. With `variety` = (days, item_gap, per_restaurant)
+    each line holds that many days, planned with multi_day.MultiDayPlanner.
+    """
+    index = index if index is not None else _index
+    rng = np.random.default_rng(seed_sequence)
+    goal = profiles['goal'].to_numpy()
+    total_calories, protein_requirement = calculate_requirements_batch(
+        profiles['weight'].to_numpy(dtype=np.float64), profiles['height'].to_numpy(dtype=np.float64),
+        profiles['age'].to_numpy(dtype=np.float64), profiles['gender'].to_numpy(), goal)
+    if variety is not None:
+        return _multi_day_lines(profiles, goal, total_calories, protein_requirement, index, rng, *variety)
+    picks, calories_consumed, protein_consumed = plan_cohort(total_calories, index, rng)
+
+    item_json = index.item_json
+    slot_names = [name for name, _, _ in MEAL_SLOTS]
+    lines = []
+    for row, name, user_goal, target, protein, user_picks, eaten, protein_eaten in zip(
+            profiles['row'].tolist(), profiles['name'].tolist(), goal, total_calories.tolist(),
+            protein_requirement.tolist(), picks.tolist(), calories_consumed.tolist(), protein_consumed.tolist()):
+        lines.append(
+            f'{{"row": {row}, "name": {json.dumps(str(name), ensure_ascii=False)}, "goal": "{user_goal}", '
+            f'"calorie_target": {target:.2f}, "protein_target": {protein:.2f}, '
+            f'"meals": {_day_json(item_json, slot_names, user_picks)}, '
+            f'"total_calories": {eaten:.2f}, "total_protein": {protein_eaten:.2f}}}\n'
+        )
+    return ''.join(lines)
+
+
+def _multi_day_lines(profiles, goal, total_calories, protein_requirement, index, rng, days, item_gap, per_restaurant):
+    from multi_day import MultiDayPlanner
+
+    # item and restaurant codes are worked out once per process
+    if getattr(index, 'multi_day', None) is None:
+        index.multi_day = MultiDayPlanner(index)
+    item_json = index.item_json
+    slot_names = [name for name, _, _ in MEAL_SLOTS]
+    picks, calories_consumed, protein_consumed = index.multi_day.plan_many(total_calories, days, item_gap,
+                                                                           per_restaurant, rng)
+    lines = []
+    for row, name, user_goal, target, protein, user_picks, eaten, protein_eaten in zip(
+            profiles['row'].tolist(), profiles['name'].tolist(), goal, total_calories.tolist(),
+            protein_requirement.tolist(), picks.tolist(), calories_consumed.tolist(), protein_consumed.tolist()):
+        day_json = ', '.join(
+            f'{{"meals": {_day_json(item_json, slot_names, day_picks)}, '
+            f'"total_calories": {day_calories:.2f}, "total_protein": {day_protein:.2f}}}'
+            for day_picks, day_calories, day_protein in zip(user_picks, eaten, protein_eaten))
+        lines.append(
+            f'{{"row": {row}, "name": {json.dumps(str(name), ensure_ascii=False)}, "goal": "{user_goal}", '
+            f'"calorie_target": {target:.2f}, "protein_target": {protein:.2f}, "days": [{day_json}]}}\n'
+        )
+    return ''.join(lines)
+
+
+def _plan_chunk(args):
+    profiles, seed_sequence, variety = args
+    return plan_lines(profiles, seed_sequence, variety=variety)
+
+
+def generate_cohort_plans(profiles, output, catalogue_path, seed=None, processes=1, chunk_size=50000, days=1,
+                          item_gap=7, per_restaurant=1):
+    """
+    Plan every valid profile and write the plans to `output` as JSONL.
+
+    Args:
+    profiles (pd.DataFrame): Raw profiles, as returned by read_profiles
+    output (str): Path of the JSONL file to write
+    catalogue_path (str): Enriched catalogue CSV (its compiled copy is used when fresh)
+    seed (int): Seed for reproducible plans (None for fresh randomness)
+    processes (int): Worker processes; 1 plans in this process
+    chunk_size (int): Users per chunk and per derived seed
+    days (int): Days per plan; above 1 each line holds a "days" list planned with variety rules
+    item_gap (int): Days before a menu item may be used again (with days > 1)
+    per_restaurant (int): Most meals per day from one restaurant (with days > 1)
+
+    Returns:
+    tuple: (planned, skipped) user counts
+    """
+    profiles, valid = normalize_profiles(profiles)
+    profiles['row'] = np.arange(len(profiles))
+    profiles = profiles[valid]
+
+    chunks = [profiles.iloc[start:start + chunk_size] for start in range(0, len(profiles), chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    variety = (days, item_gap, per_restaurant) if days > 1 else None
+    work = [(chunk, chunk_seed, variety) for chunk, chunk_seed in zip(chunks, seeds)]
+
+    # written next to the target and renamed into place, so a partial cohort is never mistaken for a full one
+    partial = output + '.partial'
+    with open(partial, 'w', encoding='utf-8') as file:
+        if processes > 1 and len(chunks) > 1:
+            with ProcessPoolExecutor(processes, initializer=_load_index, initargs=(catalogue_path,)) as pool:
+                for (chunk, _, _), lines in zip(work, pool.map(_plan_chunk, work)):
+                    file.write(lines)
+                    metrics.inc('cohort_plans_total', len(chunk))
+        else:
+            _load_index(catalogue_path)
+            for chunk in work:
+                with metrics.timer('cohort_chunk_seconds'):
+                    file.write(_plan_chunk(chunk))
+                metrics.inc('cohort_plans_total', len(chunk[0]))
+    os.replace(partial, output)
+    metrics.inc('cohort_skipped_profiles_total', int((~valid).sum()))
+    return len(profiles), int((~valid).sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate meal plans for a cohort of user profiles.")
+    parser.add_argument("profiles", help="CSV or JSONL with name, age, weight, height, gender and goal per user")
+    parser.add_argument("--output", default="meal_plans.jsonl")
+    parser.add_argument("--catalogue", default="restaurants_sample_with_nutrition.csv")
+    parser.add_argument("--seed", type=int, default=None, help="seed for reproducible plans")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes for large cohorts")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="users per chunk (part of what --seed reproduces)")
+    parser.add_argument("--days", type=int, default=1, help="days per plan, with variety across them")
+    parser.add_argument("--item-gap", type=int, default=7,
+                        help="with --days, days before a menu item may come back (7: no item twice per week)")
+    parser.add_argument("--per-restaurant", type=int, default=1, help="with --days, most meals per day from one restaurant")
+    parser.add_argument("--metrics", default=None,
+                        help="write run metrics here at the end (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    with metrics.profiled('cohort'):
+        planned, skipped = generate_cohort_plans(read_profiles(args.profiles), args.output, args.catalogue,
+                                                 args.seed, args.processes, args.chunk_size, args.days,
+                                                 args.item_gap, args.per_restaurant)
+    print(f"Wrote {planned} meal plans to {args.output} in {time.perf_counter() - start:.1f}s")
+    if skipped:
+        print(f"Note: {skipped} profiles were skipped for invalid age, weight, height, gender or goal.", file=sys.stderr)
+    if args.metrics:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Catalogue startup benchmark: CSV parsing versus the compiled columnar copy.
+
+Generates a synthetic catalogue, compiles it with catalogue.py, then loads
+the planner's columns both ways in fresh processes and reports load time,
+whole-process wall time and peak RSS.
+
+    python benchmarks/catalogue_load.py --rows 1000000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from catalogue import compile_catalogue  # noqa: E402
+from synthetic import write_synthetic_catalogue  # noqa: E402
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import catalogue
+loader = catalogue.load_csv if sys.argv[2] == 'csv' else catalogue.load_compiled
+source = sys.argv[1] if sys.argv[2] == 'csv' else catalogue.compiled_path(sys.argv[1])
+meal_data = loader(source, catalogue.PLAN_COLUMNS)
+float(meal_data['Calories'].sum())
+try:
+    # VmHWM, because ru_maxrss keeps the parent's peak across fork and exec
+    with open('/proc/self/status') as status:
+        peak_kb = next(int(line.split()[1]) for line in status if line.startswith('VmHWM'))
+except OSError:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'load': time.perf_counter() - start, 'rows': len(meal_data), 'rss_mb': peak_kb / 1024}))
+"""
+
+
+def probe(csv_path, mode):
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, '-c', PROBE, csv_path, mode], cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+    result['process'] = time.perf_counter() - start
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--csv", default=None, help="reuse this catalogue CSV instead of generating one")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = args.csv or os.path.join(tmp, 'catalogue.csv')
+        if not args.csv:
+            start = time.perf_counter()
+            write_synthetic_catalogue(args.rows, csv_path)
+            print(f"generated {args.rows} rows in {time.perf_counter() - start:.1f}s "
+                  f"({os.path.getsize(csv_path) / 1e6:.0f} MB CSV)")
+        start = time.perf_counter()
+        compile_catalogue(csv_path)
+        print(f"compiled in {time.perf_counter() - start:.1f}s")
+
+        print(f"{'source':<10} {'rows':>9} {'load s':>8} {'process s':>10} {'peak RSS MB':>12}")
+        for mode in ('csv', 'compiled'):
+            # best of several runs, each in a fresh interpreter
+            best = min((probe(csv_path, mode) for _ in range(args.repeat)), key=lambda result: result['load'])
+            print(f"{mode:<10} {best['rows']:>9} {best['load']:>8.2f} {best['process']:>10.2f} {best['rss_mb']:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
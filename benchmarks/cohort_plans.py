@@ -0,0 +1,68 @@
+"""
+Cohort planning throughput: batch_plan.py against calling
+meal_plan.generate_meal_plan once per user.
+
+Writes a synthetic catalogue (compiled with catalogue.py) and a synthetic
+cohort to a temporary directory, then plans the whole cohort in batch and a
+sample of it one user at a time.
+
+    python benchmarks/cohort_plans.py --users 1000000 --items 100000 --processes 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from batch_plan import calculate_requirements_batch, generate_cohort_plans, normalize_profiles  # noqa: E402
+from catalogue import PLAN_COLUMNS, compile_catalogue, load_catalogue  # noqa: E402
+from meal_index import MealIndex  # noqa: E402
+from meal_plan import generate_meal_plan  # noqa: E402
+from synthetic import synthetic_profiles, write_synthetic_catalogue  # noqa: E402
+
+
+def per_user_rate(catalogue_path, profiles, users):
+    index = MealIndex(load_catalogue(catalogue_path, PLAN_COLUMNS).reset_index(drop=True))
+    profiles, _ = normalize_profiles(profiles.iloc[:users])
+    total_calories, protein_requirement = calculate_requirements_batch(
+        profiles['weight'].to_numpy(dtype=np.float64), profiles['height'].to_numpy(dtype=np.float64),
+        profiles['age'].to_numpy(dtype=np.float64), profiles['gender'].to_numpy(), profiles['goal'].to_numpy())
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for calories, protein, goal in zip(total_calories, protein_requirement, profiles['goal']):
+        generate_meal_plan(calories, protein, goal, index, rng)
+    return users / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=1000000)
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--per-user-sample", type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = write_synthetic_catalogue(args.items, os.path.join(directory, 'catalogue.csv'))
+        compile_catalogue(catalogue_path)
+        profiles = synthetic_profiles(args.users)
+
+        rate = per_user_rate(catalogue_path, profiles, min(args.per_user_sample, args.users))
+        print(f"per user : {rate:,.0f} plans/s ({args.users / rate / 60:.1f} min projected for {args.users:,} users)")
+
+        start = time.perf_counter()
+        planned, _ = generate_cohort_plans(profiles, os.path.join(directory, 'plans.jsonl'), catalogue_path,
+                                           seed=0, processes=args.processes)
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(os.path.join(directory, 'plans.jsonl'))
+        print(f"batch    : {planned:,} plans in {elapsed:.1f}s = {planned / elapsed:,.0f} plans/s, "
+              f"{size / 1e6:.0f} MB of JSONL, {args.processes} process(es)")
+
+
+if __name__ == "__main__":
+    main()
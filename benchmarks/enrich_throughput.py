@@ -0,0 +1,68 @@
+"""
+Enrichment throughput benchmark for macros.Enricher.
+
+Starts the stub completions server in-process and enriches a synthetic
+batch of menu items, once with the old one-batch-at-a-time settings and
+once with the concurrent, adaptive settings.
+
+    python benchmarks/enrich_throughput.py --items 2000 --latency 0.5 --error-rate 0.05 --drop-rate 0.02
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+from macros import Enricher, make_client  # noqa: E402
+from stub_completions import StubCompletionsServer  # noqa: E402
+
+
+def synthetic_rows(count):
+    return [[str(i // 50 + 1), f"Restaurant {i // 50}", f"Dish {i}", f"Grilled dish number {i} with rice and salad", "AED 42", ""]
+            for i in range(count)]
+
+
+def run(base_url, rows, **settings):
+    enricher = Enricher(make_client(base_url), **settings)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        enriched = sum(1 for _ in enricher.run(rows))
+    elapsed = time.perf_counter() - start
+    return enriched, elapsed, enricher
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--latency-per-item", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    server = StubCompletionsServer(('127.0.0.1', 0), args.latency, args.latency_per_item, args.error_rate, retry_after=0.2,
+                                   drop_rate=args.drop_rate)
+    base_url = server.start()
+    rows = synthetic_rows(args.items)
+
+    configurations = {
+        'sequential': dict(concurrency=1, batch_size=10, min_batch_size=10, max_batch_size=10),
+        'concurrent': dict(concurrency=args.concurrency, batch_size=10, requests_per_minute=6000,
+                           tokens_per_minute=2000000, target_latency=2.0),
+    }
+    for name, settings in configurations.items():
+        enriched, elapsed, enricher = run(base_url, rows, **settings)
+        print(f"{name:<11} {enriched} items in {elapsed:.2f}s = {enriched / elapsed:.1f} items/s, "
+              f"{enricher.stats['batches']} batches, {enricher.stats['retries']} call retries, "
+              f"{enricher.stats['item_retries']} item retries, {enricher.stats['na_items']} N/A, "
+              f"final batch size {enricher.batch_size}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Local stand-in for the Deliveroo pages main.py scrapes.
+
+Serves benchmarks/fixtures/listing.html for every restaurant listing URL
+and benchmarks/fixtures/menu.html for every menu page, after an optional
+latency, so data_scrape and the full crawl can be run and timed without
+network access.
+
+For the sharded crawl, listings have --pages pages (`&page=N`; later pages
+are empty). Page N links to its own set of restaurants, while every area
+and cuisine shows the same ones, so a multi-area crawl has plenty of
+duplicates to merge. --error-rate answers that share of requests with a
+503 to exercise retries.
+
+    python benchmarks/fixture_server.py --port 8766 --latency 0.05
+    python main.py --base-url http://127.0.0.1:8766 --output /tmp/restaurants.csv
+    python main.py --base-url http://127.0.0.1:8766 --areas dubai/marina:thrr dubai/jlt --max-pages 3 --processes 4
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_page(name):
+    with open(os.path.join(FIXTURES, name), 'rb') as file:
+        return file.read()
+
+
+class FixtureServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, listing_pages=1, error_rate=0.0):
+        super().__init__(address, FixtureHandler)
+        self.latency = latency
+        self.listing_pages = listing_pages
+        self.error_rate = error_rate
+        self.pages = {'/restaurants/': load_page('listing.html'), '/menu/': load_page('menu.html')}
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def listing_page(self, page):
+        if page > self.listing_pages:
+            return b'<html><body></body></html>'
+        if page == 1:
+            return self.pages['/restaurants/']
+        return self.pages['/restaurants/'].replace(b'href="/menu/', f'href="/menu/page-{page}/'.encode())
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server._lock:
+            server.requests += 1
+            failed = random.random() < server.error_rate
+            server.errors += failed
+        if self.path.startswith('/restaurants/'):
+            page = parse_qs(urlsplit(self.path).query).get('page', ['1'])[0]
+            body = server.listing_page(int(page))
+        else:
+            body = next((page for prefix, page in server.pages.items() if self.path.startswith(prefix)), None)
+        time.sleep(server.latency)
+        if failed:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if body is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the saved listing and menu pages.")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per request")
+    parser.add_argument("--pages", type=int, default=1, help="non-empty pages per listing")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    args = parser.parse_args(argv)
+
+    server = FixtureServer(('127.0.0.1', args.port), args.latency, args.pages, args.error_rate)
+    print(f"Serving fixtures on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,299 @@
+"""
+Benchmark suite for all three stages, with JSON results and a regression
+check against a stored baseline.
+
+`run` times every benchmark (or the ones named with --only) and writes
+the results as JSON. Scraping runs against the fixture server, enrichment
+against the stub completions server, and planning against synthetic
+catalogues, so nothing needs network access or an API key. `compare`
+diffs two result files and exits non-zero when a metric got worse by
+more than --threshold.
+
+    python benchmarks/harness.py run --output benchmarks/baseline.json
+    python benchmarks/harness.py run --output /tmp/current.json
+    python benchmarks/harness.py compare benchmarks/baseline.json /tmp/current.json --threshold 0.15
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+os.environ.setdefault('OPENAI_API_KEY', 'stub')
+
+from catalogue import clean, compile_catalogue  # noqa: E402
+from meal_index import MealIndex  # noqa: E402
+
+# Work sizes for a full run and for --quick (a smoke run in well under a minute)
+SIZES = {
+    'full': {'items': 100000, 'load_rows': 1000000, 'users': 100000, 'plans': 300, 'selects': 20000,
+             'enrich_items': 400, 'scrape_repeat': 10, 'solves': 50, 'horizon_users': 10000},
+    'quick': {'items': 10000, 'load_rows': 50000, 'users': 10000, 'plans': 50, 'selects': 2000,
+              'enrich_items': 100, 'scrape_repeat': 3, 'solves': 10, 'horizon_users': 1000},
+}
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+
+def metric(value, unit, better):
+    return {'value': float(value), 'unit': unit, 'better': better}
+
+
+def best_of(function, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+_catalogues = {}
+
+
+def synthetic_meal_data(rows):
+    from synthetic import synthetic_catalogue
+
+    if rows not in _catalogues:
+        _catalogues[rows] = clean(synthetic_catalogue(rows)).reset_index(drop=True)
+    return _catalogues[rows]
+
+
+@benchmark('select_meal')
+def bench_select_meal(sizes):
+    from meal_plan import select_meal
+
+    index = MealIndex(synthetic_meal_data(sizes['items']))
+    rng = np.random.default_rng(0)
+    bounds = rng.uniform(300, 2500, sizes['selects'])
+
+    def run():
+        for remaining in bounds:
+            select_meal(remaining, min(300, remaining), 25, index, rng)
+    elapsed = best_of(run)
+    return {'select_us': metric(elapsed / len(bounds) * 1e6, 'us/call', 'lower')}
+
+
+@benchmark('generate_meal_plan')
+def bench_generate_meal_plan(sizes):
+    from meal_plan import generate_meal_plan
+
+    index = MealIndex(synthetic_meal_data(sizes['items']))
+    rng = np.random.default_rng(0)
+    targets = rng.uniform(1500, 3500, sizes['plans'])
+
+    def run():
+        for total_calories in targets:
+            generate_meal_plan(total_calories, 150, 'maintain weight', index, rng)
+    elapsed = best_of(run)
+    return {'plan_ms': metric(elapsed / len(targets) * 1000, 'ms/plan', 'lower')}
+
+
+@benchmark('solve_meal_plan')
+def bench_solve_meal_plan(sizes):
+    from meal_solver import MealSolver
+
+    solver = MealSolver(synthetic_meal_data(sizes['items']))
+    targets = np.random.default_rng(0).uniform(1500, 3500, sizes['solves'])
+    solver.solve(2000, 150)
+    latencies = []
+    misses = []
+    for total_calories in targets:
+        start = time.perf_counter()
+        plan = solver.solve(total_calories, 150)
+        latencies.append(time.perf_counter() - start)
+        misses.append(plan['penalty'] > 0)
+    return {'solve_p50_ms': metric(np.percentile(latencies, 50) * 1000, 'ms', 'lower'),
+            'solve_p99_ms': metric(np.percentile(latencies, 99) * 1000, 'ms', 'lower'),
+            'solve_missed_targets': metric(np.mean(misses), 'share', 'lower')}
+
+
+@benchmark('cohort_plans')
+def bench_cohort_plans(sizes):
+    from batch_plan import generate_cohort_plans
+    from synthetic import synthetic_profiles, write_synthetic_catalogue
+
+    with tempfile.TemporaryDirectory() as directory:
+        catalogue_path = write_synthetic_catalogue(sizes['items'], os.path.join(directory, 'catalogue.csv'))
+        compile_catalogue(catalogue_path)
+        profiles = synthetic_profiles(sizes['users'])
+        start = time.perf_counter()
+        planned, _ = generate_cohort_plans(profiles, os.path.join(directory, 'plans.jsonl'), catalogue_path, seed=0)
+        elapsed = time.perf_counter() - start
+    return {'cohort_plans_per_s': metric(planned / elapsed, 'plans/s', 'higher')}
+
+
+@benchmark('multi_day_plan')
+def bench_multi_day_plan(sizes):
+    from multi_day import MultiDayPlanner
+
+    planner = MultiDayPlanner(MealIndex(synthetic_meal_data(sizes['items'])))
+    targets = np.random.default_rng(0).uniform(1500, 3500, sizes['horizon_users'])
+    elapsed = best_of(lambda: planner.plan_many(targets, 30, 7, 1, np.random.default_rng(0)))
+    return {'multi_day_users_per_s': metric(len(targets) / elapsed, '30-day plans/s', 'higher')}
+
+
+@benchmark('catalogue_load')
+def bench_catalogue_load(sizes):
+    from catalogue_load import probe
+    from synthetic import write_synthetic_catalogue
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = write_synthetic_catalogue(sizes['load_rows'], os.path.join(directory, 'catalogue.csv'))
+        compile_catalogue(csv_path)
+        for mode in ('csv', 'compiled'):
+            # fresh interpreters, so imports and page cache behave like a real start
+            best = min((probe(csv_path, mode) for _ in range(3)), key=lambda result: result['load'])
+            results[f'load_{mode}_s'] = metric(best['load'], 's', 'lower')
+            results[f'load_{mode}_rss_mb'] = metric(best['rss_mb'], 'MB', 'lower')
+    return results
+
+
+@benchmark('data_scrape')
+def bench_data_scrape(sizes):
+    from fixture_server import FixtureServer
+    from main import data_scrape, listing_url, make_session
+    from parsers import PageParser
+
+    server = FixtureServer(('127.0.0.1', 0))
+    base_url = server.start()
+    session = make_session()
+    parser = PageParser()
+    pages = []
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            restaurants, menus = data_scrape(listing_url('arabic', base_url), session, base_url=base_url, parser=parser)
+        pages.append(1 + len(menus))
+    try:
+        # the first pass opens connections and warms the parser
+        run()
+        elapsed = best_of(run, sizes['scrape_repeat'])
+    finally:
+        parser.close()
+        session.close()
+        server.shutdown()
+    return {'scrape_pages_per_s': metric(pages[-1] / elapsed, 'pages/s', 'higher')}
+
+
+@benchmark('enrich')
+def bench_enrich(sizes):
+    from enrich_throughput import run, synthetic_rows
+    from stub_completions import StubCompletionsServer
+
+    server = StubCompletionsServer(('127.0.0.1', 0), latency=0.05, latency_per_item=0.002)
+    base_url = server.start()
+    try:
+        enriched, elapsed, enricher = run(base_url, synthetic_rows(sizes['enrich_items']), concurrency=8, batch_size=10,
+                                          requests_per_minute=60000, tokens_per_minute=20000000)
+    finally:
+        server.shutdown()
+    return {'enrich_items_per_s': metric(enriched / elapsed, 'items/s', 'higher'),
+            'enrich_batches': metric(enricher.stats['batches'], 'batches', 'lower')}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(names, quick):
+    sizes = SIZES['quick' if quick else 'full']
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        results[name] = BENCHMARKS[name](sizes)
+        summary = ', '.join(f"{key} {entry['value']:.4g} {entry['unit']}" for key, entry in results[name].items())
+        print(f"{name:<20} {summary}  ({time.perf_counter() - start:.1f}s)")
+    return {
+        'meta': {'created': time.time(), 'commit': git_commit(), 'python': platform.python_version(),
+                 'machine': platform.machine(), 'cpus': os.cpu_count(), 'mode': 'quick' if quick else 'full',
+                 'sizes': sizes},
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold):
+    """
+    Return (rows, regressions): one row per metric present in both runs,
+    with its relative change, where positive means worse.
+    """
+    rows, regressions = [], []
+    for name, metrics in current['results'].items():
+        for key, entry in metrics.items():
+            previous = baseline['results'].get(name, {}).get(key)
+            if previous is None or previous['value'] == 0:
+                continue
+            change = (entry['value'] - previous['value']) / abs(previous['value'])
+            worse = change if entry['better'] == 'lower' else -change
+            row = (f"{name}.{key}", previous['value'], entry['value'], entry['unit'], worse)
+            rows.append(row)
+            if worse > threshold:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmarks and write the results as JSON")
+    run_parser.add_argument("--output", default=None, help="results file (defaults to benchmarks/results/<time>.json)")
+    run_parser.add_argument("--only", nargs='+', choices=sorted(BENCHMARKS), default=None)
+    run_parser.add_argument("--quick", action='store_true', help="small sizes, for a fast smoke run")
+
+    compare_parser = commands.add_parser('compare', help="flag regressions of a results file against a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown counted as a regression")
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        output = args.output or os.path.join(HERE, 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+        results = run_suite(args.only or list(BENCHMARKS), args.quick)
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Results written to {output}")
+        return
+
+    with open(args.baseline, encoding='utf-8') as file:
+        baseline = json.load(file)
+    with open(args.current, encoding='utf-8') as file:
+        current = json.load(file)
+    if baseline['meta'].get('mode') != current['meta'].get('mode'):
+        print(f"Warning: comparing a {baseline['meta'].get('mode')} run against a {current['meta'].get('mode')} run")
+
+    rows, regressions = compare(baseline, current, args.threshold)
+    print(f"{'metric':<42} {'baseline':>12} {'current':>12} {'unit':<9} {'worse by':>9}")
+    for metric_name, before, after, unit, worse in rows:
+        flag = '  REGRESSION' if worse > args.threshold else ''
+        print(f"{metric_name:<42} {before:>12.4g} {after:>12.4g} {unit:<9} {worse:>+9.1%}{flag}")
+    if regressions:
+        raise SystemExit(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Parse-throughput benchmark for the scraper's HTML parser backends.
+
+Parses the saved Deliveroo listing and menu pages in benchmarks/fixtures
+with every installed backend and reports pages and megabytes per second.
+
+    python benchmarks/parse_throughput.py --repeat 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parsers import PageParser, available_backends, parse_listing_html, parse_menu_html  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding='utf-8') as file:
+        return file.read()
+
+
+def bench(parse, html, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse(html)
+    return time.perf_counter() - start
+
+
+def bench_pool(backend, html, repeat, processes):
+    # a process pool pays for pickling the page, but parses `processes` pages at once
+    parser = PageParser(backend, processes=processes)
+    futures = [parser.pool.submit(parse_menu_html, html, backend) for _ in range(processes)]
+    for future in futures:
+        future.result()  # warming up the workers
+
+    start = time.perf_counter()
+    futures = [parser.pool.submit(parse_menu_html, html, backend) for _ in range(repeat)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+    parser.close()
+    return elapsed
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    arg_parser.add_argument("--processes", type=int, default=0,
+                            help="also time menu parsing through a process pool of this size")
+    args = arg_parser.parse_args(argv)
+
+    pages = {'listing': (load_fixture('listing.html'), parse_listing_html),
+             'menu': (load_fixture('menu.html'), parse_menu_html)}
+
+    reference = {name: parse(html, 'bs4') for name, (html, parse) in pages.items()}
+
+    print(f"{'backend':<12} {'page':<8} {'pages/s':>10} {'MB/s':>8} {'speedup':>8}")
+    baseline = {}
+    for backend in available_backends():
+        for name, (html, parse) in pages.items():
+            # every backend has to agree with the original html.parser output
+            if parse(html, backend) != reference[name]:
+                raise SystemExit(f"{backend} disagrees with bs4 on the {name} fixture")
+
+            elapsed = bench(lambda page: parse(page, backend), html, args.repeat)
+            baseline.setdefault(name, elapsed)
+            pages_per_sec = args.repeat / elapsed
+            mb_per_sec = len(html.encode('utf-8')) * args.repeat / elapsed / 1e6
+            print(f"{backend:<12} {name:<8} {pages_per_sec:>10.1f} {mb_per_sec:>8.2f} {baseline[name] / elapsed:>7.1f}x")
+
+    if args.processes:
+        html = pages['menu'][0]
+        for backend in available_backends():
+            elapsed = bench_pool(backend, html, args.repeat, args.processes)
+            print(f"{backend + ' x' + str(args.processes):<12} {'menu':<8} {args.repeat / elapsed:>10.1f} "
+                  f"{len(html.encode('utf-8')) * args.repeat / elapsed / 1e6:>8.2f} {baseline['menu'] / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
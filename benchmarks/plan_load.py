@@ -0,0 +1,108 @@
+"""
+Load generator for plan_service.py.
+
+Sends plan requests for synthetic user profiles from several keep-alive
+connections and reports latency percentiles and requests per second. With
+--cold it also times the same plan done the old way, as a fresh
+`python meal_plan.py` process per plan.
+
+    python plan_service.py --port 8080 &
+    python benchmarks/plan_load.py --url http://127.0.0.1:8080 --requests 5000 --concurrency 16 --cold 5
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, ROOT)
+
+from synthetic import synthetic_profiles  # noqa: E402
+
+
+def request_bodies(count, solver, seed=0):
+    profiles = synthetic_profiles(count, seed)
+    profiles['name'] = 'Load Test'
+    bodies = []
+    for profile in profiles.to_dict('records'):
+        profile = {key: value.item() if hasattr(value, 'item') else value for key, value in profile.items()}
+        profile['solver'] = solver
+        bodies.append(json.dumps(profile).encode('utf-8'))
+    return bodies
+
+
+def worker(url, bodies, latencies, errors):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+    for body in bodies:
+        start = time.perf_counter()
+        connection.request('POST', '/plan', body, {'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        if response.status != 200:
+            errors.append(response.status)
+    connection.close()
+
+
+def run_load(url, bodies, concurrency):
+    latencies, errors = [], []
+    threads = [threading.Thread(target=worker, args=(url, bodies[i::concurrency], latencies, errors))
+               for i in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def cold_start(runs):
+    # one interactive plan per fresh process, answering the prompts through stdin
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'meal_plan.py'], input='Bob\n30\n80\n180\nmale\n1\n', cwd=ROOT,
+                       capture_output=True, text=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(label, latencies, elapsed=None, errors=()):
+    latencies = np.array(latencies) * 1000
+    line = f"{label:<7} {len(latencies):>6} requests  p50 {np.percentile(latencies, 50):8.2f} ms  p99 {np.percentile(latencies, 99):8.2f} ms"
+    if elapsed:
+        line += f"  {len(latencies) / elapsed:8.0f} req/s"
+    if errors:
+        line += f"  {len(errors)} errors"
+    print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--solver", choices=['greedy', 'optimal'], default='greedy')
+    parser.add_argument("--cold", type=int, default=0, help="also time this many fresh meal_plan.py processes")
+    args = parser.parse_args(argv)
+
+    bodies = request_bodies(args.requests, args.solver)
+    # a first pass fills the plan cache; the second shows the warm steady state
+    for label in ['first', 'warm']:
+        latencies, errors, elapsed = run_load(args.url, bodies, args.concurrency)
+        report(label, latencies, elapsed, errors)
+    if args.cold:
+        report('cold', cold_start(args.cold))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Per-plan latency of generate_meal_plan: the calorie/protein index against
+the original full-table boolean masks.
+
+    python benchmarks/select_meal.py --sizes 10000 100000 1000000 --plans 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from catalogue import clean  # noqa: E402
+from meal_index import MealIndex  # noqa: E402
+from meal_plan import generate_meal_plan  # noqa: E402
+from synthetic import synthetic_catalogue  # noqa: E402
+
+
+class MaskSelector:
+    """The original select_meal filtering, behind the MealIndex interface."""
+
+    def __init__(self, meal_data):
+        self.meal_data = meal_data
+
+    def select(self, max_calories, min_calories=-np.inf, min_protein=-np.inf, rng=None):
+        meal_data = self.meal_data
+        possible_meals = meal_data[
+            (meal_data['Calories'] <= max_calories) &
+            (meal_data['Calories'] >= min_calories) &
+            (meal_data['Protein (g)'] >= min_protein)
+        ]
+        if possible_meals.empty:
+            return None
+        return meal_data.index.get_loc(possible_meals.sample(1, random_state=rng).index[0])
+
+    def count(self, max_calories, min_calories=-np.inf, min_protein=-np.inf):
+        meal_data = self.meal_data
+        return int(((meal_data['Calories'] <= max_calories) & (meal_data['Calories'] >= min_calories) &
+                    (meal_data['Protein (g)'] >= min_protein)).sum())
+
+
+def time_plans(selector, plans, seed=0):
+    rng = np.random.default_rng(seed)
+    targets = rng.uniform(1500, 3500, plans)
+    start = time.perf_counter()
+    for target in targets:
+        generate_meal_plan(target, 150, 'maintain weight', selector, rng)
+    return (time.perf_counter() - start) / plans
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument("--plans", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    print(f"{'items':>9} {'index build ms':>15} {'masks ms/plan':>14} {'index ms/plan':>14} {'speedup':>8}")
+    for size in args.sizes:
+        meal_data = clean(synthetic_catalogue(size)).reset_index(drop=True)
+        start = time.perf_counter()
+        index = MealIndex(meal_data)
+        build = time.perf_counter() - start
+        masks = MaskSelector(meal_data)
+
+        # both selectors must see exactly the same candidate sets
+        rng = np.random.default_rng(1)
+        for _ in range(50):
+            high = rng.uniform(0, 2000)
+            query = (high, rng.uniform(0, high), rng.choice([-np.inf, 5, 15, 20, 25]))
+            assert index.count(*query) == masks.count(*query), query
+
+        mask_latency = time_plans(masks, max(1, args.plans // 10))
+        index_latency = time_plans(index, args.plans)
+        print(f"{size:>9} {build * 1000:>15.1f} {mask_latency * 1000:>14.2f} {index_latency * 1000:>14.3f} "
+              f"{mask_latency / index_latency:>7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Plan quality against latency: the greedy generate_meal_plan and the
+optimizing MealSolver on the same cohort of synthetic users.
+
+Quality is the share of plans within the calorie tolerance, the share that
+meet the protein requirement, and the mean calorie miss. For the greedy
+path it also reports how many regenerations a user needs on average to get
+a plan that meets both targets.
+
+    python benchmarks/solver_quality.py --sizes 10000 100000 1000000 --users 200
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from batch_plan import calculate_requirements_batch, normalize_profiles  # noqa: E402
+from catalogue import clean  # noqa: E402
+from meal_index import MealIndex  # noqa: E402
+from meal_plan import generate_meal_plan, solve_meal_plan  # noqa: E402
+from meal_solver import MealSolver  # noqa: E402
+from synthetic import synthetic_catalogue, synthetic_profiles  # noqa: E402
+
+
+def measure(plan, targets, tolerance):
+    latencies, misses, protein_met = [], [], []
+    for total_calories, protein_requirement, goal in targets:
+        start = time.perf_counter()
+        _, calories, protein = plan(total_calories, protein_requirement, goal)
+        latencies.append(time.perf_counter() - start)
+        misses.append(abs(calories - total_calories) / total_calories)
+        protein_met.append(protein >= protein_requirement)
+    misses, protein_met = np.array(misses), np.array(protein_met)
+    good = (misses <= tolerance) & protein_met
+    return {
+        'within': (misses <= tolerance).mean(), 'protein': protein_met.mean(), 'good': good.mean(),
+        'miss': misses.mean(), 'p50': np.percentile(latencies, 50) * 1000, 'p99': np.percentile(latencies, 99) * 1000,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    profiles, _ = normalize_profiles(synthetic_profiles(args.users, seed=1))
+    total_calories, protein_requirement = calculate_requirements_batch(
+        profiles['weight'].to_numpy(dtype=np.float64), profiles['height'].to_numpy(dtype=np.float64),
+        profiles['age'].to_numpy(dtype=np.float64), profiles['gender'].to_numpy(), profiles['goal'].to_numpy())
+    targets = list(zip(total_calories, protein_requirement, profiles['goal']))
+
+    print(f"{'items':>9} {'path':<8} {'in band':>8} {'protein':>8} {'both':>6} {'mean miss':>10} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'build s':>8}")
+    for size in args.sizes:
+        meal_data = clean(synthetic_catalogue(size)).reset_index(drop=True)
+        start = time.perf_counter()
+        index = MealIndex(meal_data)
+        index_build = time.perf_counter() - start
+        start = time.perf_counter()
+        solver = MealSolver(meal_data)
+        solver.solve(2000, 150, args.tolerance)
+        solver_build = time.perf_counter() - start
+
+        rng = np.random.default_rng(0)
+        paths = {
+            'greedy': (lambda calories, protein, goal: generate_meal_plan(calories, protein, goal, index, rng), index_build),
+            'solver': (lambda calories, protein, goal: solve_meal_plan(calories, protein, goal, solver, args.tolerance),
+                       solver_build),
+        }
+        for name, (plan, build) in paths.items():
+            result = measure(plan, targets, args.tolerance)
+            regenerations = f"  ~{1 / result['good']:.1f} tries for a good plan" if name == 'greedy' and result['good'] else ''
+            print(f"{size:>9} {name:<8} {result['within']:>8.0%} {result['protein']:>8.0%} {result['good']:>6.0%} "
+                  f"{result['miss']:>10.1%} {result['p50']:>8.2f} {result['p99']:>8.2f} {build:>8.2f}{regenerations}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Local stand-in for the OpenAI chat completions endpoint.
+
+Answers every nutrition prompt from macros.py with deterministic numbers,
+after a configurable latency. It can reject a share of requests with 429
+and a Retry-After header, and leave a share of items out of its answers,
+so enrichment throughput and recovery can be measured without network
+access or an API key.
+
+    python benchmarks/stub_completions.py --port 8900 --latency 0.5
+    OPENAI_API_KEY=stub python macros.py --base-url http://127.0.0.1:8900/v1
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_nutrition(name, description):
+    # stable numbers per item so repeated runs produce identical CSVs
+    digest = hashlib.sha256(f"{name}: {description}".encode('utf-8')).digest()
+    return {'calories': 200 + digest[0] * 3, 'protein': 5 + digest[1] % 45,
+            'fat': 3 + digest[2] % 40, 'carbs': 10 + digest[3] % 90}
+
+
+def prompt_items(prompt):
+    return json.loads(prompt.split('Items:\n', 1)[1])
+
+
+def answer(items, drop_rate=0.0):
+    entries = [dict(fake_nutrition(item['name'], item['description']), id=item['id'])
+               for item in items if random.random() >= drop_rate]
+    return json.dumps({'items': entries})
+
+
+class StubCompletionsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.2, latency_per_item=0.01, error_rate=0.0, retry_after=1.0, drop_rate=0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.latency_per_item = latency_per_item
+        self.error_rate = error_rate
+        self.drop_rate = drop_rate
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server._lock:
+            server.requests += 1
+            rejected = random.random() < server.error_rate
+            server.rejected += rejected
+
+        if not self.path.endswith('/chat/completions'):
+            self._send(404, {'error': {'message': 'not found'}})
+            return
+        if rejected:
+            self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit_error'}},
+                       {'Retry-After': str(server.retry_after)})
+            return
+
+        items = prompt_items(request['messages'][-1]['content'])
+        content = answer(items, server.drop_rate)
+        time.sleep(server.latency + server.latency_per_item * len(items))
+
+        prompt_tokens = sum(len(message['content']) for message in request['messages']) // 4
+        completion_tokens = len(content) // 4
+        self._send(200, {
+            'id': f'chatcmpl-stub-{server.requests}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': request.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens,
+                      'total_tokens': prompt_tokens + completion_tokens},
+        })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a stub chat completions endpoint.")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per request")
+    parser.add_argument("--latency-per-item", type=float, default=0.01, help="extra seconds per batch item")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="share of items left out of each answer")
+    args = parser.parse_args(argv)
+
+    server = StubCompletionsServer(('127.0.0.1', args.port), args.latency, args.latency_per_item,
+                                   args.error_rate, args.retry_after, args.drop_rate)
+    print(f"Stub completions endpoint on http://127.0.0.1:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
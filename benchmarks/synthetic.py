@@ -0,0 +1,79 @@
+"""
+Synthetic catalogue generator.
+
+Scales the restaurants_sample_with_nutrition.csv schema to any row count,
+reusing the sample's descriptions, prices and links so text columns have
+realistic lengths. A small share of rows gets "N/A" nutrition, like real
+macros.py output.
+
+    python benchmarks/synthetic.py 1000000 /tmp/catalogue_1m.csv
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE = os.path.join(ROOT, 'restaurants_sample_with_nutrition.csv')
+
+
+def synthetic_catalogue(rows, seed=0, items_per_restaurant=60, na_rate=0.01):
+    rng = np.random.default_rng(seed)
+    sample = pd.read_csv(SAMPLE)
+    pick = rng.integers(0, len(sample), rows)
+    restaurant = np.arange(rows) // items_per_restaurant
+
+    calories = rng.gamma(4.0, 120.0, rows).round()
+    protein = (calories * rng.uniform(0.01, 0.09, rows)).round()
+    fat = (calories * rng.uniform(0.01, 0.06, rows)).round()
+    carbs = (calories * rng.uniform(0.03, 0.15, rows)).round()
+    nutrition = [pd.Series(column.astype(int)).astype(object) for column in (calories, protein, fat, carbs)]
+    missing = rng.random(rows) < na_rate
+    for column in nutrition:
+        column[missing] = "N/A"
+
+    return pd.DataFrame({
+        'Restaurant ID': restaurant + 1,
+        'Restaurant Name': pd.Series(restaurant).map(lambda r: f"Restaurant {r}"),
+        'Menu Item': [f"{name} #{i % 997}" for i, name in zip(range(rows), sample['Menu Item'].to_numpy()[pick])],
+        'Description': sample['Description'].to_numpy()[pick],
+        'Price': sample['Price'].to_numpy()[pick],
+        'Link': pd.Series(restaurant).map(lambda r: f"https://deliveroo.ae/menu/Abu%20Dhabi/area/restaurant-{r}?day=today&time=ASAP"),
+        'Calories': nutrition[0],
+        'Protein (g)': nutrition[1],
+        'Fat (g)': nutrition[2],
+        'Carbs (g)': nutrition[3],
+    })
+
+
+def synthetic_profiles(rows, seed=0):
+    """User profiles in the format batch_plan.py reads."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'name': [f"user{i}" for i in range(rows)],
+        'age': rng.integers(18, 80, rows),
+        'weight': rng.normal(75, 15, rows).clip(40, 180).round(1),
+        'height': rng.normal(170, 10, rows).clip(140, 210).round(1),
+        'gender': rng.choice(['male', 'female'], rows),
+        'goal': rng.integers(1, 4, rows),
+    })
+
+
+def write_synthetic_catalogue(rows, path, seed=0):
+    synthetic_catalogue(rows, seed).to_csv(path, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic enriched catalogue CSV.")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("path")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_synthetic_catalogue(args.rows, args.path, args.seed)
+    print(f"Wrote {args.rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
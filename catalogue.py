@@ -0,0 +1,184 @@
+"""
+Compiled, columnar copy of the enriched catalogue for fast loading.
+
+`compile_catalogue` turns restaurants_sample_with_nutrition.csv into a
+directory of .npy files: the nutrition columns are cleaned once and stored
+as float32, and every text column is dictionary-encoded (int32 codes plus a
+JSON list of distinct values). `load_catalogue` reads only the columns it
+is asked for, one .npy file each, into an ordinary DataFrame (the frame
+holds its own copy, so the files can be replaced while it is in use), and
+falls back to parsing the CSV when there is no compiled copy or the CSV has
+changed since it was compiled.
+
+    python catalogue.py restaurants_sample_with_nutrition.csv
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+
+NUMERIC_COLUMNS = ['Calories', 'Protein (g)', 'Fat (g)', 'Carbs (g)']
+TEXT_COLUMNS = ['Restaurant Name', 'Menu Item', 'Description', 'Price', 'Link']
+PLAN_COLUMNS = ['Restaurant Name', 'Menu Item', 'Link', 'Calories', 'Protein (g)', 'Fat (g)', 'Carbs (g)']
+FORMAT_VERSION = 1
+
+
+def compiled_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.catalogue'
+
+
+def _column_file(name):
+    return name.lower().replace(' (g)', '').replace(' ', '_')
+
+
+def _source_signature(csv_path):
+    stat = os.stat(csv_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def clean(meal_data):
+    """
+    Drop rows without usable calories or protein and make the nutrition
+    columns numeric, the same way meal_plan.py always has.
+    """
+    # Remove rows with missing or NaN values in essential columns
+    meal_data = meal_data.dropna(subset=['Calories', 'Protein (g)'])
+
+    # Convert the nutrition columns to numeric, coercing errors to NaN
+    for column in NUMERIC_COLUMNS:
+        if column in meal_data:
+            meal_data[column] = pd.to_numeric(meal_data[column], errors='coerce')
+
+    # Remove any rows where the conversion resulted in NaN
+    return meal_data.dropna(subset=['Calories', 'Protein (g)'])
+
+
+@metrics.timed('catalogue_compile_seconds')
+def compile_catalogue(csv_path, out_dir=None):
+    """
+    Compile the enriched CSV into a columnar directory and return its path.
+    The directory is built next to the target and renamed into place, so a
+    reader never sees a half-written catalogue.
+    """
+    out_dir = out_dir or compiled_path(csv_path)
+    raw = pd.read_csv(csv_path)
+    meal_data = clean(raw.copy()).reset_index(drop=True)
+
+    build_dir = out_dir + '.tmp'
+    shutil.rmtree(build_dir, ignore_errors=True)
+    os.makedirs(build_dir)
+
+    columns = {}
+    for column in NUMERIC_COLUMNS:
+        np.save(os.path.join(build_dir, _column_file(column) + '.npy'),
+                meal_data[column].to_numpy(dtype=np.float32))
+        columns[column] = 'float32'
+
+    np.save(os.path.join(build_dir, 'restaurant_id.npy'), meal_data['Restaurant ID'].to_numpy(dtype=np.int32))
+    columns['Restaurant ID'] = 'int32'
+
+    for column in TEXT_COLUMNS:
+        codes, values = pd.factorize(meal_data[column])
+        np.save(os.path.join(build_dir, _column_file(column) + '.npy'), codes.astype(np.int32))
+        with open(os.path.join(build_dir, _column_file(column) + '.json'), 'w', encoding='utf-8') as file:
+            json.dump([str(value) for value in values], file, ensure_ascii=False)
+        columns[column] = 'dictionary'
+
+    meta = {
+        'version': FORMAT_VERSION,
+        'rows': len(meal_data),
+        'source_rows': len(raw),
+        'columns': columns,
+        'source': _source_signature(csv_path),
+        'compiled_at': time.time(),
+    }
+    with open(os.path.join(build_dir, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=2)
+
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(build_dir, out_dir)
+    return out_dir
+
+
+def read_meta(out_dir):
+    try:
+        with open(os.path.join(out_dir, 'meta.json'), encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def is_fresh(csv_path, out_dir):
+    meta = read_meta(out_dir)
+    if meta is None or meta.get('version') != FORMAT_VERSION:
+        return False
+    # a compiled copy with no CSV beside it is still usable
+    return not os.path.exists(csv_path) or meta['source'] == _source_signature(csv_path)
+
+
+def load_compiled(out_dir, columns=None):
+    meta = read_meta(out_dir)
+    columns = columns or list(meta['columns'])
+    data = {}
+    for column in columns:
+        kind = meta['columns'][column]
+        # mapped rather than read, so the only full copy of a column is the one the DataFrame makes
+        codes = np.load(os.path.join(out_dir, _column_file(column) + '.npy'), mmap_mode='r')
+        if kind == 'dictionary':
+            with open(os.path.join(out_dir, _column_file(column) + '.json'), encoding='utf-8') as file:
+                values = json.load(file)
+            data[column] = pd.Categorical.from_codes(codes, values)
+        else:
+            data[column] = codes
+    meal_data = pd.DataFrame(data, columns=columns)
+    meal_data.attrs['skipped'] = meta['source_rows'] - meta['rows']
+    meal_data.attrs['source_rows'] = meta['source_rows']
+    return meal_data
+
+
+def load_csv(csv_path, columns=None):
+    raw = pd.read_csv(csv_path, usecols=columns)
+    meal_data = clean(raw)
+    meal_data.attrs['skipped'] = len(raw) - len(meal_data)
+    meal_data.attrs['source_rows'] = len(raw)
+    return meal_data
+
+
+def load_catalogue(csv_path, columns=None):
+    """
+    Load the catalogue for planning, from the compiled copy when there is a
+    fresh one and from the CSV otherwise. `columns` limits what is loaded.
+    """
+    out_dir = compiled_path(csv_path)
+    source = 'compiled' if is_fresh(csv_path, out_dir) else 'csv'
+    with metrics.timer('catalogue_load_seconds', source=source):
+        meal_data = load_compiled(out_dir, columns) if source == 'compiled' else load_csv(csv_path, columns)
+    metrics.gauge('catalogue_items', len(meal_data))
+    metrics.gauge('catalogue_skipped_items', meal_data.attrs['skipped'])
+    return meal_data
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the enriched CSV into a fast-loading columnar catalogue.")
+    parser.add_argument("csv", nargs='?', default='restaurants_sample_with_nutrition.csv')
+    parser.add_argument("--output", default=None, help="target directory (defaults to <csv name>.catalogue)")
+    parser.add_argument("--metrics", default=None,
+                        help="write run metrics here at the end (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    out_dir = compile_catalogue(args.csv, args.output)
+    meta = read_meta(out_dir)
+    print(f"Compiled {meta['rows']} of {meta['source_rows']} items into {out_dir} in {time.perf_counter() - start:.2f}s")
+    if args.metrics:
+        metrics.write(args.metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import csv
+import io
+import json
+import os
+
+
+class AtomicCSVWriter:
+    """
+    Streams CSV rows into `<path>.partial` and only renames it over `path`
+    in `commit()`, so readers of `path` never see a half-written file.
+
+    Writes go through a binary file so `tell()` is an exact byte offset;
+    passing such an offset back as `resume_at` truncates the partial file
+    to it and continues appending from there.
+    """
+
+    def __init__(self, path, headers, resume_at=None):
+        self.path = path
+        self.partial_path = path + '.partial'
+        if resume_at is not None and os.path.exists(self.partial_path):
+            self.file = open(self.partial_path, 'r+b')
+            self.file.truncate(resume_at)
+            self.file.seek(resume_at)
+        else:
+            self.file = open(self.partial_path, 'wb')
+            self.write_rows([headers])
+
+    def write_rows(self, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        self.file.write(buffer.getvalue().encode('utf-8'))
+
+    def tell(self):
+        self.file.flush()
+        return self.file.tell()
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.partial_path, self.path)
+
+
+class Journal:
+    """
+    Append-only journal of JSON records, one per line, fsynced as they are
+    written. A torn last line from a crash is ignored when the journal is
+    read back and cut off before anything new is appended.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self._valid_length = 0
+
+    def records(self):
+        self._valid_length = 0
+        try:
+            with open(self.path, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self._valid_length += len(line)
+                    yield record
+        except FileNotFoundError:
+            return
+
+    def open(self, resume=False):
+        if resume and os.path.exists(self.path):
+            # dropping a torn last record before appending after it
+            self.file = open(self.path, 'r+b')
+            self.file.truncate(self._valid_length)
+            self.file.seek(self._valid_length)
+        else:
+            self.file = open(self.path, 'wb')
+
+    def append(self, record):
+        self.file.write((json.dumps(record, ensure_ascii=False) + '\n').encode('utf-8'))
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def finish(self):
+        self.file.close()
+        os.remove(self.path)
+
+
+class CrawlCheckpoint(Journal):
+    """
+    Journal of crawl progress. A 'restaurant' record holds the planned
+    restaurant and the byte offsets of the output files right after its
+    rows were written; a 'cuisine' record marks a cuisine whose listing and
+    menus are all written, and lists every restaurant on that listing (a
+    restaurant planned under an earlier cuisine picks up this one when the
+    journal is loaded); a 'committed' record means the output files
+    were swapped into place and only the crawl state is left to save.
+    """
+
+    def load(self):
+        """
+        Return (done cuisines, done restaurants in order, last offsets,
+        committed) from a previous run, or empty state if there is no
+        journal.
+        """
+        cuisines, restaurants, offsets, committed = set(), [], None, False
+        listed = []
+        for record in self.records():
+            if record['type'] == 'cuisine':
+                cuisines.add(record['cuisine'])
+                listed.append((record['cuisine'], record.get('restaurants', [])))
+            elif record['type'] == 'committed':
+                committed = True
+            else:
+                restaurants.append(record['restaurant'])
+                offsets = record['offsets']
+
+        by_key = {restaurant['key']: restaurant for restaurant in restaurants}
+        for cuisine, keys in listed:
+            for key in keys:
+                if key in by_key and cuisine not in by_key[key]['cuisines']:
+                    by_key[key]['cuisines'].append(cuisine)
+        return cuisines, restaurants, offsets, committed
+
+    def restaurant(self, planned, offsets):
+        self.append({'type': 'restaurant', 'restaurant': planned, 'offsets': offsets})
+
+    def cuisine(self, cuisine, restaurants=()):
+        self.append({'type': 'cuisine', 'cuisine': cuisine, 'restaurants': list(restaurants)})
+
+    def committed(self):
+        self.append({'type': 'committed'})
+
+
+class RowLedger(Journal):
+    """
+    Journal of finished rows for a resumable stage. Each record lists the
+    keys of a group of rows and the output's byte offset right after they
+    were written.
+    """
+
+    def load(self):
+        """
+        Return (set of done row keys, last offset) from a previous run, or
+        empty state if there is no ledger.
+        """
+        done, offset = set(), None
+        for record in self.records():
+            done.update(record['keys'])
+            offset = record['offset']
+        return done, offset
+
+    def record(self, keys, offset):
+        self.append({'keys': keys, 'offset': offset})
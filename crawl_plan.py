@@ -0,0 +1,156 @@
+import json
+import os
+from urllib.parse import unquote, urlsplit, urlunsplit
+
+from fileutil import atomic_write
+
+
+def canonical_url(url):
+    """
+    Canonical form of a restaurant menu URL: lower-cased scheme and host,
+    decoded path without a trailing slash, and no query string (the
+    `day`, `time` and `geohash` parameters change between listings but not
+    the restaurant).
+    """
+    parts = urlsplit(url)
+    path = unquote(parts.path).rstrip('/')
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, '', ''))
+
+
+def _item_key(item, seen):
+    # menus repeat a dish under several sections, so the n-th copy of a name gets its own key
+    count = seen.get(item['name'], 0)
+    seen[item['name']] = count + 1
+    return f"{item['name']}#{count}"
+
+
+def diff_menu(previous, current):
+    """
+    Compare two menus (lists of name/description/price dicts) and return
+    a list of (change, item) pairs where change is 'added', 'changed' or
+    'removed'. Unchanged items are left out.
+    """
+    seen = {}
+    old = {_item_key(item, seen): item for item in previous}
+    seen = {}
+    new = {_item_key(item, seen): item for item in current}
+
+    delta = []
+    for key, item in new.items():
+        if key not in old:
+            delta.append(('added', item))
+        elif old[key] != item:
+            delta.append(('changed', item))
+    for key, item in old.items():
+        if key not in new:
+            delta.append(('removed', item))
+    return delta
+
+
+class CrawlPlanner:
+    """
+    Plans one crawl across all cuisines.
+
+    Restaurants are identified by their canonical URL, so a restaurant that
+    shows up under several cuisines is only fetched once and keeps the same
+    ID from run to run. When `state_dir` is given, the ID registry and the
+    last menu of every restaurant (one JSON file per restaurant under
+    `menus/`) are kept there between runs. New menus are staged under
+    `menus.new/` and only replace the previous snapshots in `save()`, so an
+    interrupted crawl still diffs against the last complete one.
+    """
+
+    def __init__(self, state_dir=None):
+        self.state_dir = state_dir
+        self.registry = {}
+        self.planned = []
+        self._planned_by_url = {}
+        if state_dir:
+            self.registry = _load_json(os.path.join(state_dir, 'restaurants.json'), {})
+        # IDs are never reused, so new restaurants count up from the highest one ever given out
+        self.next_id = max((entry['id'] for entry in self.registry.values()), default=0) + 1
+
+    def restore(self, planned_restaurants):
+        """
+        Re-plan restaurants that a resumed crawl already finished, so they
+        keep their IDs and are not fetched again.
+        """
+        for planned in planned_restaurants:
+            self.registry.setdefault(planned['key'], {'id': planned['id'], 'name': planned['name'], 'cuisines': []})
+            self.next_id = max(self.next_id, planned['id'] + 1)
+            self.planned.append(planned)
+            self._planned_by_url[planned['key']] = planned
+
+    def add(self, restaurant, cuisine):
+        """
+        Record `restaurant` as listed under `cuisine`. Returns the planned
+        restaurant dict (with 'id' and 'cuisines') the first time a URL is
+        seen in this run, and None when its menu is already planned.
+        """
+        key = canonical_url(restaurant['url'])
+        if key in self._planned_by_url:
+            planned = self._planned_by_url[key]
+            if cuisine not in planned['cuisines']:
+                planned['cuisines'].append(cuisine)
+            return None
+
+        if key not in self.registry:
+            self.registry[key] = {'id': self.next_id, 'name': restaurant['name'], 'cuisines': []}
+            self.next_id += 1
+        entry = self.registry[key]
+        entry['name'] = restaurant['name']
+
+        planned = dict(restaurant, id=entry['id'], key=key, cuisines=[cuisine])
+        self.planned.append(planned)
+        self._planned_by_url[key] = planned
+        return planned
+
+    def _snapshot_path(self, planned, folder='menus'):
+        return os.path.join(self.state_dir, folder, f"{planned['id']}.json")
+
+    def previous_menu(self, planned):
+        if not self.state_dir:
+            return []
+        return _load_json(self._snapshot_path(planned), [])
+
+    def rows_for(self, planned, menu):
+        return [[planned['id'], planned['name'], item['name'], item['description'], item['price'], planned['url']]
+                for item in menu]
+
+    def delta_for(self, planned, menu):
+        """
+        Rows for the items of `planned` that were added, changed or removed
+        since the previous snapshot, prefixed with the kind of change.
+        """
+        return [[change, planned['id'], planned['name'], item['name'], item['description'], item['price'], planned['url']]
+                for change, item in diff_menu(self.previous_menu(planned), menu)]
+
+    def stage(self, planned, menu):
+        if self.state_dir:
+            path = self._snapshot_path(planned, 'menus.new')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            atomic_write(path, json.dumps(menu, ensure_ascii=False))
+
+    def save(self):
+        if not self.state_dir:
+            return
+        for planned in self.planned:
+            self.registry[planned['key']]['cuisines'] = planned['cuisines']
+
+        # promoting the staged menus; a failed fetch was never staged and keeps its old snapshot
+        staged_dir = os.path.join(self.state_dir, 'menus.new')
+        snapshot_dir = os.path.join(self.state_dir, 'menus')
+        os.makedirs(snapshot_dir, exist_ok=True)
+        if os.path.isdir(staged_dir):
+            for name in os.listdir(staged_dir):
+                os.replace(os.path.join(staged_dir, name), os.path.join(snapshot_dir, name))
+            os.rmdir(staged_dir)
+        atomic_write(os.path.join(self.state_dir, 'restaurants.json'), json.dumps(self.registry, ensure_ascii=False))
+
+
+def _load_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return default
@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from crawl_plan import canonical_url
+from rate_limit import backoff_delay
+
+
+class CrawlQueue:
+    """
+    Persistent work queue for a sharded crawl, in one SQLite file shared by
+    every worker process.
+
+    A unit of work is a listing page (area, cuisine, page) or a restaurant
+    menu. Workers `lease` a unit for a limited time, and a unit whose lease
+    runs out (its worker died) is handed to another worker. A failed unit
+    is retried with backoff until it has used up `max_attempts`.
+
+    Results are stored next to the queue: which restaurants each listing
+    page showed, and each restaurant's menu. Menu units are keyed by the
+    restaurant's canonical URL, so a restaurant listed under several areas,
+    cuisines or pages is only fetched once.
+    """
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # transactions are opened explicitly, so concurrent workers serialize on BEGIN IMMEDIATE
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS units ("
+            " id INTEGER PRIMARY KEY, kind TEXT, key TEXT UNIQUE, payload TEXT,"
+            " state TEXT DEFAULT 'pending', attempts INTEGER DEFAULT 0, available_at REAL DEFAULT 0,"
+            " leased_by TEXT, lease_until REAL, error TEXT);"
+            "CREATE INDEX IF NOT EXISTS units_state ON units (state, available_at);"
+            "CREATE TABLE IF NOT EXISTS restaurants (key TEXT PRIMARY KEY, name TEXT, url TEXT);"
+            "CREATE TABLE IF NOT EXISTS listings ("
+            " restaurant TEXT, area TEXT, geohash TEXT, cuisine TEXT, seed INTEGER, page INTEGER, position INTEGER,"
+            " PRIMARY KEY (restaurant, area, geohash, cuisine));"
+            "CREATE TABLE IF NOT EXISTS menus (restaurant TEXT PRIMARY KEY, items TEXT);"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def seed(self, areas, cuisines):
+        """
+        Queue the first listing page of every (area, geohash) and cuisine.
+        Seeds that are already queued are left as they are.
+        """
+        with self._transaction() as connection:
+            units = []
+            for area, geohash in areas:
+                for cuisine in cuisines:
+                    payload = {'area': area, 'geohash': geohash, 'cuisine': cuisine, 'page': 1, 'seed': len(units)}
+                    units.append(('listing', _listing_key(area, geohash, cuisine, 1), json.dumps(payload)))
+            connection.executemany("INSERT OR IGNORE INTO units (kind, key, payload) VALUES (?, ?, ?)", units)
+
+    def retry_failed(self):
+        # a resumed crawl gives units that ran out of attempts a fresh set
+        with self._transaction() as connection:
+            return connection.execute(
+                "UPDATE units SET state = 'pending', attempts = 0, available_at = 0 WHERE state = 'failed'").rowcount
+
+    def lease(self, worker, lease_seconds=60.0):
+        """
+        Take the oldest unit that is ready to run and return (id, kind,
+        payload), or None when nothing is ready right now.
+        """
+        now = time.time()
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE units SET state = 'failed', error = 'lease expired' "
+                "WHERE state = 'leased' AND lease_until <= ? AND attempts >= ?", (now, self.max_attempts))
+            row = connection.execute(
+                "SELECT id, kind, payload FROM units "
+                "WHERE (state = 'pending' AND available_at <= ?) OR (state = 'leased' AND lease_until <= ?) "
+                "ORDER BY id LIMIT 1", (now, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute(
+                "UPDATE units SET state = 'leased', attempts = attempts + 1, leased_by = ?, lease_until = ? WHERE id = ?",
+                (worker, now + lease_seconds, row[0]))
+        return row[0], row[1], json.loads(row[2])
+
+    def _finish(self, connection, unit_id, worker):
+        # a worker whose lease ran out while it was busy drops its result; the unit belongs to the next lessee
+        return connection.execute(
+            "UPDATE units SET state = 'done', error = NULL WHERE id = ? AND state = 'leased' AND leased_by = ?",
+            (unit_id, worker)).rowcount == 1
+
+    def complete_listing(self, unit_id, worker, listing, restaurants, max_pages=1):
+        """
+        Record the restaurants (name/url dicts) found on a listing page,
+        queue a menu unit for each restaurant not seen before, and queue
+        the listing's next page while pages keep showing new restaurants
+        and `max_pages` allows.
+        """
+        area, geohash, cuisine, page = listing['area'], listing['geohash'] or '', listing['cuisine'], listing['page']
+        with self._transaction() as connection:
+            if not self._finish(connection, unit_id, worker):
+                return False
+            new_here = 0
+            for position, restaurant in enumerate(restaurants):
+                key = canonical_url(restaurant['url'])
+                connection.execute("INSERT OR IGNORE INTO restaurants VALUES (?, ?, ?)",
+                                   (key, restaurant['name'], restaurant['url']))
+                new_here += connection.execute("INSERT OR IGNORE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                               (key, area, geohash, cuisine, listing['seed'], page, position)).rowcount
+                connection.execute("INSERT OR IGNORE INTO units (kind, key, payload) VALUES ('menu', ?, ?)",
+                                   ('menu ' + key, json.dumps({'key': key, 'name': restaurant['name'],
+                                                               'url': restaurant['url']})))
+            # a site that ignores the page parameter repeats page 1, which adds nothing new for this listing
+            if new_here and page < max_pages:
+                connection.execute("INSERT OR IGNORE INTO units (kind, key, payload) VALUES ('listing', ?, ?)",
+                                   (_listing_key(area, geohash, cuisine, page + 1), json.dumps(dict(listing, page=page + 1))))
+        return True
+
+    def complete_menu(self, unit_id, worker, restaurant, menu):
+        with self._transaction() as connection:
+            if not self._finish(connection, unit_id, worker):
+                return False
+            connection.execute("INSERT OR REPLACE INTO menus VALUES (?, ?)",
+                               (restaurant['key'], json.dumps(menu, ensure_ascii=False)))
+        return True
+
+    def fail(self, unit_id, worker, error):
+        """
+        Give a unit back after an error: it is retried after a backoff, or
+        marked failed once it has used all its attempts.
+        """
+        with self._transaction() as connection:
+            row = connection.execute("SELECT attempts FROM units WHERE id = ? AND state = 'leased' AND leased_by = ?",
+                                     (unit_id, worker)).fetchone()
+            if row is None:
+                return
+            attempts = row[0]
+            if attempts >= self.max_attempts:
+                connection.execute("UPDATE units SET state = 'failed', error = ? WHERE id = ?", (str(error), unit_id))
+            else:
+                connection.execute("UPDATE units SET state = 'pending', error = ?, available_at = ? WHERE id = ?",
+                                   (str(error), time.time() + backoff_delay(attempts - 1), unit_id))
+
+    def wait_time(self):
+        """
+        Seconds until the next unit may be ready (0 when one is ready now),
+        or None when every unit is done or failed.
+        """
+        row = self.connection.execute(
+            "SELECT MIN(CASE state WHEN 'pending' THEN available_at ELSE lease_until END) FROM units "
+            "WHERE state IN ('pending', 'leased')").fetchone()
+        if row[0] is None:
+            return None
+        return max(0.0, row[0] - time.time())
+
+    def summary(self):
+        """{kind: {state: count}} over every queued unit."""
+        summary = {}
+        for kind, state, count in self.connection.execute("SELECT kind, state, COUNT(*) FROM units GROUP BY kind, state"):
+            summary.setdefault(kind, {})[state] = count
+        return summary
+
+    def failures(self):
+        return self.connection.execute(
+            "SELECT kind, key, attempts, error FROM units WHERE state = 'failed' ORDER BY id").fetchall()
+
+    def results(self, cuisines):
+        """
+        Yield (restaurant, cuisines, menu) once per restaurant, merged over
+        every area and page it was listed under. Restaurants come in the
+        order of their first listing (seed order, then page and position),
+        so the result doesn't depend on which worker finished first. menu
+        is None when the restaurant's menu could not be fetched.
+        """
+        cuisine_rank = {cuisine: rank for rank, cuisine in enumerate(cuisines)}
+        first_seen, listed_under = {}, {}
+        for key, cuisine, seed, page, position in self.connection.execute(
+                "SELECT restaurant, cuisine, seed, page, position FROM listings"):
+            first_seen[key] = min(first_seen.get(key, (seed, page, position)), (seed, page, position))
+            listed_under.setdefault(key, set()).add(cuisine)
+
+        for key in sorted(first_seen, key=first_seen.get):
+            name, url = self.connection.execute("SELECT name, url FROM restaurants WHERE key = ?", (key,)).fetchone()
+            menu = self.connection.execute("SELECT items FROM menus WHERE restaurant = ?", (key,)).fetchone()
+            restaurant_cuisines = sorted(listed_under[key], key=lambda cuisine: cuisine_rank.get(cuisine, len(cuisines)))
+            yield {'name': name, 'url': url}, restaurant_cuisines, json.loads(menu[0]) if menu else None
+
+    def close(self):
+        self.connection.close()
+
+
+def _listing_key(area, geohash, cuisine, page):
+    # one area can be seeded at several geohashes, each with its own listings
+    return f"listing {area}:{geohash or ''} {cuisine} {page}"
+
+
+def reset_queue(path):
+    # a fresh crawl starts from an empty queue; WAL mode keeps two side files next to it
+    for suffix in ['', '-wal', '-shm']:
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
@@ -0,0 +1,18 @@
+import os
+import tempfile
+
+
+def atomic_write(path, text):
+    """
+    Write `text` to `path` through a temporary file in the same directory
+    and rename it into place, so readers see the old file or the new one,
+    never a half-written one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as tmp_file:
+            tmp_file.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,45 @@
+"""
+One command for every stage: scrape, enrich, compile and plan.
+
+    python gigachad.py scrape --workers 8
+    python gigachad.py enrich --concurrency 8
+    python gigachad.py compile
+    python gigachad.py plan --solver optimal
+
+Everything after the stage name goes to that stage's own options (see
+`python gigachad.py <stage> --help`). A stage's module is only imported
+when it runs, so `plan` never pays for bs4, requests or openai, and
+`scrape` never for pandas.
+"""
+import argparse
+import importlib
+import sys
+
+# stage: (module with a main(argv), description)
+STAGES = {
+    'scrape': ('main', "crawl restaurant listings and menus into restaurants_sample.csv"),
+    'enrich': ('macros', "add nutrition estimates to the scraped menu CSV"),
+    'compile': ('catalogue', "compile the enriched CSV into a fast-loading catalogue"),
+    'plan': ('meal_plan', "interactive meal plan for one user"),
+    'cohort': ('batch_plan', "meal plans for a file of user profiles"),
+    'serve': ('plan_service', "serve meal plans over HTTP"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='gigachad', description=__doc__.strip().splitlines()[0],
+        epilog="stages:\n" + "\n".join(f"  {stage:<9} {description}" for stage, (_, description) in STAGES.items()),
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("stage", choices=STAGES, metavar="stage", help="one of: " + ", ".join(STAGES))
+    parser.add_argument("args", nargs=argparse.REMAINDER, help="options for the stage")
+    args = parser.parse_args(argv)
+
+    module_name, _ = STAGES[args.stage]
+    # so the stage's own usage and errors read "gigachad plan ..."
+    sys.argv[0] = f"gigachad {args.stage}"
+    importlib.import_module(module_name).main(args.args)
+
+
+if __name__ == "__main__":
+    main()
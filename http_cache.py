@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import metrics
+from fileutil import atomic_write
+
+
+class CachedResponse:
+    """
+    Minimal stand-in for `requests.Response` with the fields the scraper
+    reads (status_code and text).
+    """
+
+    def __init__(self, status_code, text, from_cache=False):
+        self.status_code = status_code
+        self.text = text
+        self.from_cache = from_cache
+
+
+class HTTPCache:
+    """
+    Persistent page cache for the scraper.
+
+    Every successful response is stored under `directory` as a body file and
+    a small JSON record (url, ETag, Last-Modified, fetch time), keyed by a
+    hash of the URL. Entries younger than `ttl` seconds are served without
+    touching the network; older ones are revalidated with a conditional GET
+    and reused on a 304. With `offline=True` the cache is replayed as-is and
+    a URL that was never fetched comes back as a 504.
+    """
+
+    def __init__(self, directory='.http_cache', ttl=24 * 3600, offline=False):
+        self.directory = directory
+        self.ttl = ttl
+        self.offline = offline
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, key[:2], key)
+        return base + '.json', base + '.html'
+
+    def load(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, encoding='utf-8') as body_file:
+                body = body_file.read()
+        except (OSError, ValueError):
+            return None, None
+        return meta, body
+
+    def store(self, url, body, etag=None, last_modified=None):
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': time.time(),
+        }
+        # body first, then the record, so a reader never sees a record without its body
+        atomic_write(body_path, body)
+        atomic_write(meta_path, json.dumps(meta))
+
+    def _touch(self, url, meta):
+        meta_path, _ = self._paths(url)
+        meta['fetched_at'] = time.time()
+        atomic_write(meta_path, json.dumps(meta))
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+        metrics.inc('http_cache_lookups_total', result=name)
+
+    def fetch(self, url, get):
+        """
+        Return the page for `url`, calling `get(url, headers)` only when the
+        cached copy is missing or stale.
+        """
+        meta, body = self.load(url)
+
+        if self.offline:
+            if meta is None:
+                self._count('misses')
+                return CachedResponse(504, '', from_cache=True)
+            self._count('hits')
+            return CachedResponse(200, body, from_cache=True)
+
+        if meta is not None and time.time() - meta['fetched_at'] < self.ttl:
+            self._count('hits')
+            return CachedResponse(200, body, from_cache=True)
+
+        # revalidating a stale entry with a conditional GET
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = get(url, headers)
+        if response.status_code == 304 and meta is not None:
+            self._count('revalidated')
+            self._touch(url, meta)
+            return CachedResponse(200, body, from_cache=True)
+
+        self._count('misses')
+        if response.status_code == 200:
+            self.store(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response
+
+    def summary(self):
+        return f"cache: {self.hits} fresh hits, {self.revalidated} revalidated, {self.misses} fetched"
@@ -1,103 +1,411 @@
+import argparse
 import csv
+import hashlib
+import json
+import math
 import time
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from tqdm import tqdm
 
-# Load environment variables
-load_dotenv()
+from checkpoint import AtomicCSVWriter, RowLedger
+from nutrition_cache import NutritionCache, item_key
+from rate_limit import TokenBucket, backoff_delay, retry_after_seconds
+import metrics
 
-# Set up OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+MODEL = "gpt-3.5-turbo"
+NUTRITION_HEADERS = ['Calories', 'Protein (g)', 'Fat (g)', 'Carbs (g)']
+NA_VALUES = ["N/A", "N/A", "N/A", "N/A"]
 
-def get_nutritional_info_batch(items):
-    max_retries = 3
-    for attempt in range(max_retries):
-        try:
-            messages = [
-                {"role": "system", "content": "You are a nutritional assistant. Provide estimates for calories, protein, fat, and carbs based on food descriptions."},
-                {"role": "user", "content": "For each of the following food items, estimate the calories, protein (g), fat (g), and carbs (g). Respond with only the four numbers separated by commas for each item, with items separated by semicolons:\n" + "\n".join([f"{name}: {description}" for name, description in items])}
-            ]
-            
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=messages
-            )
-            
-            results = response.choices[0].message.content.strip().split(';')
-            return [parse_nutrition_info(result.strip()) for result in results]
-        except Exception as e:
-            print(f"Error in API call (attempt {attempt + 1}/{max_retries}): {e}")
-            if attempt == max_retries - 1:
-                print("Max retries reached. Returning default values.")
-                return [["N/A", "N/A", "N/A", "N/A"]] * len(items)
-            time.sleep(5)  # Wait for 5 seconds before retrying
-
-def parse_nutrition_info(info_string):
+
+def make_client(base_url=None):
+    # openai and dotenv are only imported here, so importing this module stays cheap
+    from dotenv import load_dotenv
+    from openai import OpenAI
+
+    # Load environment variables
+    load_dotenv()
+    # Set up OpenAI client; retries are handled here, so the client's own retries are off
+    return OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=base_url, max_retries=0)
+
+
+def build_messages(items):
+    # Every item carries its position in the batch as an ID, so answers are matched by ID, not by order
+    listing = json.dumps([{"id": i, "name": name, "description": description}
+                          for i, (name, description) in enumerate(items)], ensure_ascii=False)
+    return [
+        {"role": "system", "content": "You are a nutritional assistant. Provide estimates for calories, protein, fat, and carbs based on food descriptions. Always answer with JSON only."},
+        {"role": "user", "content": 'For each of the following food items, estimate the calories, protein (g), fat (g), and carbs (g). Respond with a JSON object of the form {"items": [{"id": <id>, "calories": <number>, "protein": <number>, "fat": <number>, "carbs": <number>}]} containing one entry for every id.\nItems:\n' + listing}
+    ]
+
+
+def estimate_tokens(messages, item_count):
+    # Roughly 4 characters per prompt token, plus about 30 tokens of JSON answer per item
+    return sum(len(message["content"]) for message in messages) // 4 + 30 * item_count
+
+
+def format_number(value):
+    return str(int(value)) if value == int(value) else f"{value:.1f}"
+
+
+def parse_nutrition_response(content, item_count):
+    """
+    Parse the model's JSON answer into {id: [calories, protein, fat, carbs]}.
+    Entries with an unknown ID or a missing, non-numeric, negative or
+    non-finite value are left out, so the caller can retry just those
+    items. An answer that is not valid JSON yields an empty dict.
+    """
     try:
-        values = info_string.split(',')
-        return [value.strip() for value in values[:4]]  # Take only the first 4 values
-    except:
-        return ["N/A", "N/A", "N/A", "N/A"]
-
-# Read the CSV file
-input_file = 'restaurants_sample.csv'
-output_file = 'restaurants_sample_with_nutrition.csv'
-
-try:
-    with open(input_file, 'r', newline='', encoding='utf-8') as infile, \
-         open(output_file, 'w', newline='', encoding='utf-8') as outfile:
-        
-        reader = csv.reader(infile)
-        writer = csv.writer(outfile)
-        
-        # Write header
-        header = next(reader)
-        header.extend(['Calories', 'Protein (g)', 'Fat (g)', 'Carbs (g)'])
-        writer.writerow(header)
-        
-        # Process rows in batches
-        batch_size = 10
-        batch = []
-        for row in tqdm(reader, desc="Processing menu items"):
+        entries = json.loads(content)["items"]
+    except (ValueError, KeyError, TypeError):
+        return {}
+
+    results = {}
+    for entry in entries if isinstance(entries, list) else []:
+        try:
+            item_id = int(entry["id"])
+            values = [float(entry[field]) for field in ("calories", "protein", "fat", "carbs")]
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= item_id < item_count and all(math.isfinite(value) and value >= 0 for value in values):
+            results[item_id] = [format_number(value) for value in values]
+    return results
+
+
+def request_nutrition_batch(client, items, model=MODEL):
+    """
+    Make one completions call for a batch of (name, description) pairs.
+    Returns {position in batch: nutrition info} for the items that came
+    back valid, and the number of tokens the call used; API errors are
+    raised to the caller.
+    """
+    messages = build_messages(items)
+    response = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+
+    used = response.usage.total_tokens if response.usage else estimate_tokens(messages, len(items))
+    return parse_nutrition_response(response.choices[0].message.content, len(items)), used
+
+
+def get_nutritional_info_batch(items, client=None, model=MODEL, max_retries=3):
+    enricher = Enricher(client or make_client(), model=model, concurrency=1, max_retries=max_retries)
+    return enricher.enrich_batch(items)
+
+
+class Enricher:
+    """
+    Sends nutrition batches to the completions endpoint with several
+    batches in flight at once.
+
+    Every call first takes a request from a requests-per-minute bucket and
+    its estimated tokens from a tokens-per-minute bucket, so the run stays
+    under the account's rate limits instead of sleeping a fixed time after
+    each batch. Failed calls back off exponentially with jitter, honouring
+    Retry-After. The batch size adapts as the run goes: it grows while
+    calls come back faster than `target_latency` and shrinks on slow calls
+    and errors.
+    """
+
+    def __init__(self, client, model=MODEL, concurrency=4, requests_per_minute=500, tokens_per_minute=60000,
+                 batch_size=10, min_batch_size=2, max_batch_size=40, target_latency=15.0, max_retries=5,
+                 cache=None, readahead=1000):
+        self.client = client
+        self.cache = cache
+        self.readahead = readahead
+        self.model = model
+        self.concurrency = concurrency
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.batch_size = batch_size
+        self.min_batch_size = min_batch_size
+        self.max_batch_size = max_batch_size
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.latency = None
+        self.stats = {'batches': 0, 'items': 0, 'retries': 0, 'item_retries': 0, 'na_items': 0, 'tokens': 0,
+                      'cache_hits': 0, 'duplicates': 0}
+        self._lock = threading.Lock()
+
+    def _record(self, ok, latency=None, tokens=0):
+        with self._lock:
+            if ok:
+                self.stats['batches'] += 1
+                self.stats['tokens'] += tokens
+                metrics.inc('llm_batches_total', model=self.model)
+                metrics.inc('llm_tokens_total', tokens, model=self.model)
+                metrics.observe('llm_request_seconds', latency, model=self.model)
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                if self.latency < self.target_latency:
+                    self.batch_size = min(self.max_batch_size, self.batch_size + 1)
+                else:
+                    self.batch_size = max(self.min_batch_size, int(self.batch_size * 0.75))
+            else:
+                self.stats['retries'] += 1
+                metrics.inc('llm_retries_total', model=self.model)
+                self.batch_size = max(self.min_batch_size, self.batch_size // 2)
+
+    def _request(self, items):
+        estimate = estimate_tokens(build_messages(items), len(items))
+        self.requests.acquire()
+        self.tokens.acquire(estimate)
+
+        start = time.monotonic()
+        results, used = request_nutrition_batch(self.client, items, self.model)
+        self.tokens.adjust(used - estimate)
+        self._record(ok=True, latency=time.monotonic() - start, tokens=used)
+        return results
+
+    def enrich_batch(self, items):
+        """
+        Estimate a batch of (name, description) pairs, returning one
+        nutrition info list per item in the same order.
+
+        A failed call is retried with backoff. Items that come back missing
+        or invalid are retried on their own, split into two smaller batches
+        each round, so the rest of the batch is not paid for again. Items
+        still unresolved after `max_retries` attempts get "N/A" values.
+        """
+        results = [None] * len(items)
+        work = deque([(list(range(len(items))), 0)])
+        while work:
+            indices, attempt = work.popleft()
             try:
-                batch.append(row)
-                if len(batch) == batch_size:
-                    items = [(row[2], row[3]) for row in batch]  # Name is in the third column, description in the fourth
-                    nutrition_infos = get_nutritional_info_batch(items)
-                    
-                    for row, nutrition_info in zip(batch, nutrition_infos):
-                        # Ensure we have 4 values, if not, pad with "N/A"
-                        nutrition_info = (nutrition_info + ["N/A"]*4)[:4]
-                        row.extend(nutrition_info)
-                        writer.writerow(row)
-                        print(f"Processed: {row[2]} - {row[3][:50]}...")  # Print name and first 50 chars of description
-                        print(f"Nutrition: Calories: {nutrition_info[0]}, Protein: {nutrition_info[1]}, Fat: {nutrition_info[2]}, Carbs: {nutrition_info[3]}")
-                        print("-" * 50)
-                    
-                    batch = []
-                    time.sleep(3)  # Delay to avoid hitting rate limits
+                answers = self._request([items[i] for i in indices])
             except Exception as e:
-                print(f"Error processing row: {e}")
-                continue  # Skip this row and continue with the next
-        
-        # Process any remaining items
-        if batch:
-            items = [(row[2], row[3]) for row in batch]
-            nutrition_infos = get_nutritional_info_batch(items)
-            for row, nutrition_info in zip(batch, nutrition_infos):
-                nutrition_info = (nutrition_info + ["N/A"]*4)[:4]
+                self._record(ok=False)
+                tqdm.write(f"Error in API call (attempt {attempt + 1}/{self.max_retries}): {e}")
+                if attempt + 1 < self.max_retries:
+                    time.sleep(backoff_delay(attempt, retry_after=retry_after_seconds(e)))
+                    work.append((indices, attempt + 1))
+                continue
+
+            missing = []
+            for position, i in enumerate(indices):
+                if position in answers:
+                    results[i] = answers[position]
+                else:
+                    missing.append(i)
+            if missing and attempt + 1 < self.max_retries:
+                with self._lock:
+                    self.stats['item_retries'] += len(missing)
+                metrics.inc('llm_item_retries_total', len(missing), model=self.model)
+                half = (len(missing) + 1) // 2
+                work.extend((part, attempt + 1) for part in (missing[:half], missing[half:]) if part)
+
+        failed = results.count(None)
+        if failed:
+            tqdm.write(f"Max retries reached for {failed} item(s). Returning default values.")
+            with self._lock:
+                self.stats['na_items'] += failed
+            metrics.inc('llm_na_items_total', failed, model=self.model)
+        return [info if info is not None else NA_VALUES for info in results]
+
+    def _submit(self, pool, queued, in_flight):
+        keys = list(queued)
+        in_flight.append((keys, [queued[k] for k in keys], pool.submit(self.enrich_batch, [queued[k] for k in keys])))
+        queued.clear()
+
+    def _collect(self, in_flight, resolved):
+        keys, items, future = in_flight.popleft()
+        fresh = []
+        for k, item, nutrition_info in zip(keys, items, future.result()):
+            resolved[k] = nutrition_info
+            if nutrition_info is not NA_VALUES:
+                fresh.append((k, item, nutrition_info))
+        if self.cache is not None and fresh:
+            self.cache.put_many(fresh, self.model)
+
+    def run(self, rows, key=lambda row: (row[2], row[3])):
+        """
+        Enrich an iterable of CSV rows, yielding (row, nutrition_info) in
+        input order. `key` picks the (name, description) pair from a row;
+        the default matches the scraper's column layout.
+
+        Items are identified by their normalized content, so each distinct
+        item is looked up in the cache or sent to the API at most once per
+        run, however many rows share it.
+        """
+        rows = iter(rows)
+        waiting = deque()   # (row, item key) in input order
+        resolved = {}       # item key -> nutrition info known in this run
+        queued = {}         # item key -> (name, description) for the next batch
+        in_flight = deque()
+        in_flight_keys = set()
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                # Read ahead until a couple of batches are queued behind every worker
+                while not exhausted and len(in_flight) < 2 * self.concurrency and len(waiting) < self.readahead:
+                    row = next(rows, None)
+                    if row is None:
+                        exhausted = True
+                        break
+                    name, description = key(row)
+                    k = item_key(name, description, self.model)
+                    waiting.append((row, k))
+                    if k in resolved or k in queued or k in in_flight_keys:
+                        self.stats['duplicates'] += 1
+                        metrics.inc('enrich_duplicate_items_total')
+                        continue
+                    cached = self.cache.get(k) if self.cache is not None else None
+                    if cached is not None:
+                        self.stats['cache_hits'] += 1
+                        metrics.inc('enrich_cache_hits_total')
+                        resolved[k] = cached
+                        continue
+                    queued[k] = (name, description)
+                    if len(queued) >= self.batch_size:
+                        in_flight_keys.update(queued)
+                        self._submit(pool, queued, in_flight)
+
+                # Send a partial batch rather than stall when there is room for it
+                if queued and len(in_flight) < 2 * self.concurrency:
+                    in_flight_keys.update(queued)
+                    self._submit(pool, queued, in_flight)
+
+                while waiting and waiting[0][1] in resolved:
+                    row, k = waiting.popleft()
+                    self.stats['items'] += 1
+                    metrics.inc('enrich_items_total')
+                    yield row, resolved[k]
+
+                if in_flight:
+                    in_flight_keys.difference_update(in_flight[0][0])
+                    self._collect(in_flight, resolved)
+                elif exhausted and not waiting:
+                    return
+
+    def summary(self, elapsed):
+        stats = self.stats
+        return (f"{stats['items']} items in {stats['batches']} batches over {elapsed:.1f}s "
+                f"({stats['items'] / elapsed if elapsed else 0:.1f} items/s), {stats['retries']} call retries, "
+                f"{stats['item_retries']} item retries, {stats['na_items']} N/A items, {stats['tokens']} tokens, "
+                f"{stats['cache_hits']} cache hits, {stats['duplicates']} duplicates")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Add nutrition estimates to the scraped menu CSV.")
+    parser.add_argument("--input", default='restaurants_sample.csv')
+    parser.add_argument("--output", default='restaurants_sample_with_nutrition.csv')
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--base-url", default=None,
+                        help="completions API root, e.g. a local stub server")
+    parser.add_argument("--concurrency", type=int, default=4, help="batches in flight at once")
+    parser.add_argument("--rpm", type=int, default=500, help="requests per minute limit")
+    parser.add_argument("--tpm", type=int, default=60000, help="tokens per minute limit")
+    parser.add_argument("--batch-size", type=int, default=10, help="starting batch size")
+    parser.add_argument("--max-batch-size", type=int, default=40)
+    parser.add_argument("--cache", default='.nutrition_cache.sqlite',
+                        help="SQLite cache of earlier estimates, keyed by normalized item content and model")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted run from its ledger instead of starting over")
+    parser.add_argument("--no-cache", action="store_true", help="ignore the cache and re-estimate every item")
+    parser.add_argument("--metrics", default=None,
+                        help="write run metrics here at the end (.prom for Prometheus text, otherwise JSON)")
+    return parser.parse_args(argv)
+
+
+def keyed_rows(rows):
+    """
+    Pair every row with a stable key: a hash of its content plus how many
+    identical rows came before it, so repeated rows stay distinct.
+    """
+    seen = {}
+    for row in rows:
+        digest = hashlib.sha256('\x1f'.join(row).encode('utf-8')).hexdigest()[:20]
+        count = seen.get(digest, 0)
+        seen[digest] = count + 1
+        yield f"{digest}-{count}", row
+
+
+def run_enrichment(args):
+    cache = None if args.no_cache else NutritionCache(args.cache)
+    enricher = Enricher(make_client(args.base_url), model=args.model, concurrency=args.concurrency,
+                        requests_per_minute=args.rpm, tokens_per_minute=args.tpm,
+                        batch_size=args.batch_size, max_batch_size=args.max_batch_size, cache=cache)
+
+    # Read the CSV file
+    input_file = args.input
+    output_file = args.output
+    ledger = RowLedger(output_file + '.ledger')
+
+    try:
+        done, offset = ledger.load() if args.resume else (set(), None)
+        if offset is not None and not os.path.exists(output_file + '.partial'):
+            print("No partial output to resume from, starting over.")
+            done, offset = set(), None
+        if done:
+            print(f"Resuming: {len(done)} rows already enriched.")
+
+        with open(input_file, 'r', newline='', encoding='utf-8') as infile:
+            total = sum(1 for _ in csv.reader(infile)) - 1
+            infile.seek(0)
+            reader = csv.reader(infile)
+
+            # Results go to <output>.partial and only replace the output once the run is complete
+            header = next(reader)
+            header.extend(NUTRITION_HEADERS)
+            writer = AtomicCSVWriter(output_file, header, offset)
+            ledger.open(resume=offset is not None)
+
+            # Process rows in concurrent, rate-limited batches
+            todo = ((k, row) for k, row in keyed_rows(reader) if k not in done)
+            progress = tqdm(total=total, initial=len(done), desc="Enriching menu items", unit="item")
+            start = time.monotonic()
+            pending_keys, pending_rows, last_flush = [], [], start
+            for (k, row), nutrition_info in enricher.run(todo, key=lambda keyed: (keyed[1][2], keyed[1][3])):
                 row.extend(nutrition_info)
-                writer.writerow(row)
-                print(f"Processed: {row[2]} - {row[3][:50]}...")
-                print(f"Nutrition: Calories: {nutrition_info[0]}, Protein: {nutrition_info[1]}, Fat: {nutrition_info[2]}, Carbs: {nutrition_info[3]}")
-                print("-" * 50)
+                pending_keys.append(k)
+                pending_rows.append(row)
+
+                # Flush to disk and the ledger in groups rather than per row
+                now = time.monotonic()
+                if len(pending_rows) >= 200 or now - last_flush > 2:
+                    writer.write_rows(pending_rows)
+                    ledger.record(pending_keys, writer.tell())
+                    progress.update(len(pending_rows))
+                    progress.set_postfix(batches=enricher.stats['batches'], cached=enricher.stats['cache_hits'],
+                                         na=enricher.stats['na_items'], refresh=False)
+                    pending_keys, pending_rows, last_flush = [], [], now
+
+            writer.write_rows(pending_rows)
+            ledger.record(pending_keys, writer.tell())
+            progress.update(len(pending_rows))
+            progress.close()
+
+            writer.commit()
+            ledger.finish()
+
+        print(f"Processing complete. Results written to {output_file}")
+        print(enricher.summary(time.monotonic() - start))
+        stats = enricher.stats
+        estimated = stats['items'] - stats['cache_hits'] - stats['duplicates']
+        metrics.gauge('enrich_na_ratio', stats['na_items'] / estimated if estimated else 0.0)
+
+    except Exception as e:
+        print(f"An error occurred: {e}")
+        print("Finished rows are kept; run again with --resume to continue.")
+
+    finally:
+        if cache is not None:
+            cache.close()
+        print("Script execution completed.")
+
 
-    print(f"Processing complete. Results written to {output_file}")
 
-except Exception as e:
-    print(f"An error occurred: {e}")
+def main(argv=None):
+    args = parse_args(argv)
+    with metrics.profiled('enrich'):
+        run_enrichment(args)
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
 
-finally:
-    print("Script execution completed.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,115 +1,507 @@
-from bs4 import BeautifulSoup
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from collections import deque
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+import argparse
+import os
+import threading
 import requests
+import time
 import csv
 
-def data_scrape(web_url):
+from checkpoint import AtomicCSVWriter, CrawlCheckpoint
+from crawl_plan import CrawlPlanner
+from crawl_queue import CrawlQueue, reset_queue
+from http_cache import HTTPCache
+from parsers import PageParser, available_backends
+import metrics
+
+BASE_URL = "https://deliveroo.ae"
+# the delivery area crawled when no --areas are given
+DEFAULT_AREA = ('abu-dhabi/saadiyat', 'thqew2ggd3ss')
+# (connect, read) seconds; a hung connection fails like any other error instead of blocking its worker,
+# well within the default --lease-seconds
+REQUEST_TIMEOUT = (10, 30)
+
+CSV_HEADERS = ['Restaurant ID', 'Restaurant Name', 'Menu Item', 'Description', 'Price', 'Link']
+
+CUISINE_LIST = [
+    'american', 'arabic', 'asian', 'breakfast','café', 'chinese','drinks','filipino',
+    'grocery','healthy','indian','italian','japanese', 'lebanese','mexican',
+    'middle+eastern','north+indian','pakistani','thai'] #choices for the type of cuisine
+
+
+def listing_url(cuisine, base_url=BASE_URL, area=DEFAULT_AREA, page=1):
+    area_path, geohash = area
+    geohash_param = f'geohash={geohash}&' if geohash else ''
+    page_param = f'&page={page}' if page > 1 else ''
+    return f'{base_url}/restaurants/{area_path}?{geohash_param}sort=rating&offer=all+offers&cuisine={cuisine}{page_param}'
+
+
+def parse_area(seed):
+    """
+    Parse an --areas seed, 'abu-dhabi/saadiyat:thqew2ggd3ss' or just
+    'abu-dhabi/saadiyat', into an (area, geohash) pair.
+    """
+    area, _, geohash = seed.strip().partition(':')
+    if not area:
+        raise argparse.ArgumentTypeError(f"invalid area {seed!r}, expected <city>/<area>[:<geohash>]")
+    return area.strip('/'), geohash or None
+
+
+class HostLimiter:
+    """
+    Keeps the crawl polite (see Ethics.md): caps the number of in-flight
+    requests per host and spaces request starts so a host never sees more
+    than `rate` requests per second.
+    """
+
+    def __init__(self, max_per_host=2, rate=2.0):
+        self.max_per_host = max_per_host
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_start = {}
+
+    def _semaphore(self, host):
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._semaphores[host]
+
+    @contextmanager
+    def slot(self, url):
+        host = urlsplit(url).netloc
+        waiting = time.perf_counter()
+        with self._semaphore(host):
+            # reserving the next free start time for this host
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_start.get(host, now))
+                if self.rate:
+                    self._next_start[host] = start + 1.0 / self.rate
+            if start > now:
+                time.sleep(start - now)
+            metrics.observe('http_limiter_wait_seconds', time.perf_counter() - waiting, host=urlsplit(url).hostname)
+            yield
+
+
+def make_session(pool_size=10):
+    # one keep-alive connection pool shared by every worker
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _timed_get(getter, url, headers):
+    # latency and status per host, not counting time spent waiting on the limiter
+    host = urlsplit(url).hostname
+    start = time.perf_counter()
+    try:
+        response = getter(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    except requests.RequestException:
+        metrics.inc('http_responses_total', host=host, status='error')
+        raise
+    metrics.observe('http_request_seconds', time.perf_counter() - start, host=host)
+    metrics.inc('http_responses_total', host=host, status=response.status_code)
+    return response
+
+
+def _get(url, session=None, limiter=None, headers=None):
+    getter = session.get if session is not None else requests.get
+    if limiter is None:
+        return _timed_get(getter, url, headers)
+    with limiter.slot(url):
+        return _timed_get(getter, url, headers)
+
+
+def fetch(url, session=None, limiter=None, cache=None):
+    if cache is None:
+        return _get(url, session, limiter)
+    # only cache misses and revalidations count against the host limits
+    return cache.fetch(url, lambda url, headers: _get(url, session, limiter, headers))
+
+
+def parse_listing(html, base_url=BASE_URL, parser=None, limit=1):
+    # getting restaurant names & URLs
+    restaurant_tags = (parser or PageParser()).listing(html)
+    print(f"Found {len(restaurant_tags)} restaurants on the main page.")
+
+    # extracting restaurant names & URLs
+    top_restaurants = []
+    for restaurant_name, href in restaurant_tags[:limit or None]:  # limiting to the top `limit` restaurants (0 for all) under each cuisine + top offers
+        if restaurant_name is not None:
+            restaurant_url = base_url + href  # getting restaurant's specific URL
+            print(f"Restaurant found: {restaurant_name}")
+            top_restaurants.append({'name': restaurant_name, 'url': restaurant_url})
+    return top_restaurants
+
+
+def parse_menu(html, restaurant_name, parser=None):
+    # finding all menu item cards & their name, description and price
+    card_count, restaurant_menu = (parser or PageParser()).menu(html)
+    print(f"Found {card_count} menu item sections for {restaurant_name}")
+    return restaurant_menu
+
+
+def scrape_listing(web_url, session=None, limiter=None, base_url=BASE_URL, cache=None, parser=None, limit=1):
     print(f"Fetching data from: {web_url}")
-    response = requests.get(web_url)
+    response = fetch(web_url, session, limiter, cache)
 
-    if response.status_code == 200: 
+    if response.status_code == 200:
         print("Successfully fetched the main page data.")
-        html_data = BeautifulSoup(response.text, 'html.parser')
-
-        # getting restaurant names & URLs
-        restaurant_tags = html_data.find_all('a', class_="HomeFeedUICard-3e299003014c14f9")
-        print(f"Found {len(restaurant_tags)} restaurants on the main page.")
-
-        # extracting restaurant names & URLs
-        top_restaurants = []
-        for tag in restaurant_tags[:1]:  # limiting to top 10 restaurants under each cuisine + top offers
-            restaurant_name_tag = tag.find('p', class_="ccl-649204f2a8e630fd ccl-a396bc55704a9c8a ccl-ff5caa8a6f2b96d0 ccl-40ad99f7b47f3781")
-            if restaurant_name_tag:
-                restaurant_name = restaurant_name_tag.get_text()  # getting restaurant name
-                restaurant_url = "https://deliveroo.ae" + tag['href']  # getting restaurant's specific URL
-                print(f"Restaurant found: {restaurant_name}")
-                top_restaurants.append({'name': restaurant_name, 'url': restaurant_url})
-      
-        menu_items = []
-
-        for restaurant in top_restaurants:
-            print(f"Fetching menu for restaurant: {restaurant['name']}")
-            restaurant_menu = []
-
-            # making a request to each restaurant's menu page
-            restaurant_response = requests.get(restaurant['url'])
-            if restaurant_response.status_code == 200:
-                print(f"Successfully fetched menu page for {restaurant['name']}")
-                html_menu_data = BeautifulSoup(restaurant_response.text, 'html.parser')
-
-                # finding all divs with the specific class for menu items
-                menu_item_divs = html_menu_data.find_all('div', class_="MenuItemCard-03b1bfbfe7cb723c MenuItemCard-3217cba068edacdb")
-                
-                print(f"Found {len(menu_item_divs)} menu item sections for {restaurant['name']}")
-
-                # iterating through each div & finding specific p tags for item names
-                for div in menu_item_divs:
-                    # finding item name within this div
-                    item_name_tag = div.find('p', class_="ccl-649204f2a8e630fd ccl-a396bc55704a9c8a ccl-0956b2f88e605eb8 ccl-ff5caa8a6f2b96d0 ccl-40ad99f7b47f3781")
-                    description_tag = div.find('span', class_="ccl-649204f2a8e630fd ccl-6f43f9bb8ff2d712 ccl-08c109442f3e666d")
-                    price_tag = div.find('span', class_="ccl-649204f2a8e630fd ccl-6f43f9bb8ff2d712 ccl-32ec9a3197735a65 ccl-08c109442f3e666d")
-
-                    if item_name_tag and description_tag and price_tag:
-                        menu_item = {
-                            "name": item_name_tag.get_text(),
-                            "description": description_tag.get_text(),
-                            "price": price_tag.get_text(),
-                        }
-                        restaurant_menu.append(menu_item)
-
-            # appending the menu for the restaurant
-            menu_items.append({
-                "restaurant": restaurant,
-                "menu": restaurant_menu
-            })
-
-        return top_restaurants, menu_items
-    else:
-        print(f"Failed to fetch data from {web_url}. Status code: {response.status_code}")
+        return parse_listing(response.text, base_url, parser, limit)
+    print(f"Failed to fetch data from {web_url}. Status code: {response.status_code}")
+    return None
+
+
+def scrape_menu(restaurant, session=None, limiter=None, cache=None, parser=None):
+    print(f"Fetching menu for restaurant: {restaurant['name']}")
+    restaurant_menu = []
+
+    # making a request to each restaurant's menu page
+    restaurant_response = fetch(restaurant['url'], session, limiter, cache)
+    fetched = restaurant_response.status_code == 200
+    if fetched:
+        print(f"Successfully fetched menu page for {restaurant['name']}")
+        restaurant_menu = parse_menu(restaurant_response.text, restaurant['name'], parser)
+
+    # appending the menu for the restaurant
+    return {
+        "restaurant": restaurant,
+        "menu": restaurant_menu,
+        "fetched": fetched,
+    }
+
+
+def data_scrape(web_url, session=None, limiter=None, base_url=BASE_URL, cache=None, parser=None):
+    top_restaurants = scrape_listing(web_url, session, limiter, base_url, cache, parser)
+    if top_restaurants is None:
         return [], []
 
+    menu_items = [scrape_menu(restaurant, session, limiter, cache, parser) for restaurant in top_restaurants]
+    return top_restaurants, menu_items
+
+
+def _crawl_event(entry):
+    subject, future = entry
+    if future is None:
+        return 'cuisine', subject, None
+    result = future.result()
+    return 'restaurant', subject, result['menu'] if result['fetched'] else None
+
+
+def crawl(cuisine_list, planner, workers=1, max_per_host=2, rate=2.0, base_url=BASE_URL, cache=None, parser=None,
+          limit=1):
+    """
+    Crawl every cuisine listing and fetch each planned restaurant's menu
+    once, yielding results as they are ready so they can be written out
+    straight away:
+
+    ('restaurant', planned, menu) for every planned restaurant, where menu
+    is None if its page could not be fetched, and ('cuisine', cuisine, None)
+    once a cuisine's listing and every menu it planned have been yielded.
 
-def write_to_csv(data, filename):
+    With `workers` > 1, listing and menu pages are fetched by a bounded
+    thread pool over one pooled session. Events come out in plan order
+    either way, so both paths produce the same rows.
+    """
+    session = make_session(pool_size=max(workers, max_per_host))
+    limiter = HostLimiter(max_per_host=max_per_host if workers > 1 else 1, rate=rate)
+
+    if workers <= 1:
+        for cuisine in cuisine_list:
+            print(f"Processing cuisine: {cuisine}")
+            web_url = listing_url(cuisine, base_url)
+
+            # scraping static restaurant data using BeautifulSoup
+            for restaurant in scrape_listing(web_url, session, limiter, base_url, cache, parser, limit) or []:
+                planned = planner.add(restaurant, cuisine)
+                if planned is not None:
+                    result = scrape_menu(planned, session, limiter, cache, parser)
+                    yield 'restaurant', planned, result['menu'] if result['fetched'] else None
+            yield 'cuisine', cuisine, None
+        session.close()
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        listing_futures = [
+            pool.submit(scrape_listing, listing_url(cuisine, base_url), session, limiter, base_url, cache, parser, limit)
+            for cuisine in cuisine_list
+        ]
+
+        # menus are queued as soon as their listing page is parsed, once per restaurant
+        pending = deque()
+        for cuisine, future in zip(cuisine_list, listing_futures):
+            for restaurant in future.result() or []:
+                planned = planner.add(restaurant, cuisine)
+                if planned is not None:
+                    pending.append((planned, pool.submit(scrape_menu, planned, session, limiter, cache, parser)))
+            pending.append((cuisine, None))
+
+            # handing over whatever has already finished at the head of the queue
+            while pending and (pending[0][1] is None or pending[0][1].done()):
+                yield _crawl_event(pending.popleft())
+
+        while pending:
+            yield _crawl_event(pending.popleft())
+
+    session.close()
+
+
+def crawl_worker(queue_path, worker, args):
+    """
+    Work through a sharded crawl's queue until every unit is done or has
+    failed, and return how many units this worker finished. Each worker
+    process has its own session, limiter, cache handle and parser, and
+    gets an equal share of the --rate budget.
+    """
+    worker_id = f"{os.getpid()}-{worker}"
+    queue = CrawlQueue(queue_path, args.max_attempts)
+    session = make_session(pool_size=1)
+    limiter = HostLimiter(max_per_host=1, rate=args.rate / max(1, args.processes))
+    cache = HTTPCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline) if args.cache_dir else None
+    parser = PageParser(args.parser)
+    finished = 0
+    try:
+        while True:
+            unit = queue.lease(worker_id, args.lease_seconds)
+            if unit is None:
+                wait = queue.wait_time()
+                if wait is None:
+                    break
+                # waiting on a retry backoff or on another worker's lease
+                time.sleep(min(max(wait, 0.05), 1.0))
+                continue
+
+            unit_id, kind, payload = unit
+            try:
+                if kind == 'listing':
+                    web_url = listing_url(payload['cuisine'], args.base_url, (payload['area'], payload['geohash']), payload['page'])
+                    restaurants = scrape_listing(web_url, session, limiter, args.base_url, cache, parser, args.per_listing)
+                    if restaurants is None:
+                        raise RuntimeError(f"listing page could not be fetched: {web_url}")
+                    done = queue.complete_listing(unit_id, worker_id, payload, restaurants, args.max_pages)
+                else:
+                    result = scrape_menu(payload, session, limiter, cache, parser)
+                    if not result['fetched']:
+                        raise RuntimeError(f"menu page could not be fetched: {payload['url']}")
+                    done = queue.complete_menu(unit_id, worker_id, payload, result['menu'])
+            except Exception as error:
+                # retried with backoff by whichever worker leases it next
+                print(f"Error in {kind} unit {unit_id} (will retry if attempts remain): {error}")
+                queue.fail(unit_id, worker_id, error)
+                continue
+            finished += done
+    finally:
+        parser.close()
+        session.close()
+        queue.close()
+    return finished
+
+
+def merge_sharded_crawl(queue, args):
+    """
+    Write every restaurant in the queue's results once, with its IDs and
+    menu deltas kept in --state-dir exactly as in the single-area crawl.
+    Returns the number of unique restaurants.
+    """
+    planner = CrawlPlanner(args.state_dir)
+    output = AtomicCSVWriter(args.output, CSV_HEADERS)
+    delta = AtomicCSVWriter(args.delta_output, ['Change'] + CSV_HEADERS)
+    for restaurant, cuisines, menu in queue.results(CUISINE_LIST):
+        planned = planner.add(restaurant, cuisines[0])
+        for cuisine in cuisines[1:]:
+            planner.add(restaurant, cuisine)
+        # a menu that failed every attempt writes no rows and keeps its previous snapshot
+        if menu is not None:
+            output.write_rows(planner.rows_for(planned, menu))
+            delta.write_rows(planner.delta_for(planned, menu))
+            planner.stage(planned, menu)
+    output.commit()
+    delta.commit()
+    planner.save()
+    return len(planner.planned)
+
+
+def run_sharded_crawl(args):
+    if args.offline and not args.cache_dir:
+        raise SystemExit("--offline needs --cache-dir")
+    queue_path = args.queue or os.path.join(args.state_dir, 'queue.sqlite')
+    os.makedirs(os.path.dirname(os.path.abspath(queue_path)), exist_ok=True)
+    if not args.resume:
+        reset_queue(queue_path)
+
+    queue = CrawlQueue(queue_path, args.max_attempts)
+    if args.resume:
+        retried = queue.retry_failed()
+        print(f"Resuming the queue in {queue_path}" + (f", retrying {retried} failed units." if retried else "."))
+    queue.seed(args.areas, CUISINE_LIST)
+
+    # every worker opens the queue itself, so the pool only needs its path
+    processes = max(1, args.processes)
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            finished = sum(pool.map(crawl_worker, [queue_path] * processes, range(processes), [args] * processes))
+    else:
+        finished = crawl_worker(queue_path, 0, args)
+
+    summary = queue.summary()
+    print(f"Finished {finished} units: " + ", ".join(f"{kind} {states}" for kind, states in sorted(summary.items())))
+    for kind, key, attempts, error in queue.failures():
+        print(f"Gave up on {key} after {attempts} attempts: {error}")
+
+    unique = merge_sharded_crawl(queue, args)
+    queue.close()
+    print(f"All data processed successfully. {unique} unique restaurants from {len(args.areas)} areas written to {args.output}.")
+
+
+def write_to_csv(data, filename, headers=None):
     print(f"Writing data to CSV file: {filename}")
     # defining CSV headers
-    headers = ['Restaurant ID', 'Restaurant Name', 'Menu Item', 'Description', 'Price', 'Link']
-    
+    headers = headers or CSV_HEADERS
+
     # opening CSV file in write mode
     with open(filename, mode='w', newline='', encoding='utf-8') as file:
         writer = csv.writer(file)
-        
+
         # writing header
         writer.writerow(headers)
-        
+
         # writing the data rows
         for row in data:
             writer.writerow(row)
     print("CSV writing complete.")
 
-def main():
-    cuisine_list =  [
-        'american', 'arabic', 'asian', 'breakfast','café', 'chinese','drinks','filipino',
-        'grocery','healthy','indian','italian','japanese', 'lebanese','mexican',
-        'middle+eastern','north+indian','pakistani','thai'] #choices for the type of cuisine
-    
-    csv_data = []
-    restaurant_id = 1  # starting with restaurant ID 1
-
-    for cuisine in cuisine_list:
-        print(f"Processing cuisine: {cuisine}")
-        web_url = f'https://deliveroo.ae/restaurants/abu-dhabi/saadiyat?geohash=thqew2ggd3ss&sort=rating&offer=all+offers&cuisine={cuisine}'
-        
-        # scraping static restaurant data using BeautifulSoup
-        restaurant_names, menus = data_scrape(web_url)
-
-        # processing data for CSV writing
-        for restaurant, menu in zip(restaurant_names, menus):
-            for item in menu['menu']:
-                # appending restaurant ID, restaurant name, menu item details to CSV data
-                    csv_data.append([restaurant_id, restaurant['name'], item['name'], item['description'], item['price'], restaurant['url']])
-            restaurant_id += 1
-
-    # writing the data to CSV
-    write_to_csv(csv_data, 'restaurants_sample.csv')
-    print("All data processed successfully.")
-
-main()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Scrape Deliveroo restaurant menus into a CSV file.",
+                                     fromfile_prefix_chars='@')
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of concurrent fetches (1 keeps the original sequential crawl)")
+    parser.add_argument("--per-host", type=int, default=2,
+                        help="maximum in-flight requests per host")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="maximum requests per second per host (0 disables the limit)")
+    parser.add_argument("--base-url", default=BASE_URL,
+                        help="site root, e.g. a local fixture server")
+    parser.add_argument("--output", default='restaurants_sample.csv')
+    parser.add_argument("--cache-dir", default=None,
+                        help="keep fetched pages in this directory and revalidate them on later runs")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600,
+                        help="seconds a cached page is reused without revalidation")
+    parser.add_argument("--offline", action="store_true",
+                        help="replay pages from --cache-dir without touching the network")
+    parser.add_argument("--parser", choices=available_backends(), default=None,
+                        help="HTML parser backend (defaults to the fastest one installed)")
+    parser.add_argument("--parse-processes", type=int, default=0,
+                        help="parse pages in this many worker processes so parsing overlaps with fetching")
+    parser.add_argument("--state-dir", default='.crawl_state',
+                        help="where restaurant IDs and the previous menu snapshots are kept between runs")
+    parser.add_argument("--delta-output", default='restaurants_delta.csv',
+                        help="CSV of menu items added, changed or removed since the previous run")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue an interrupted crawl from its checkpoint instead of starting over")
+    parser.add_argument("--metrics", default=None,
+                        help="write run metrics here at the end (.prom for Prometheus text, otherwise JSON)")
+    parser.add_argument("--per-listing", type=int, default=None,
+                        help="restaurants taken from each listing page, 0 for all (default: 1, or all with --areas)")
+
+    sharded = parser.add_argument_group("sharded crawl", "crawl many delivery areas through a persistent work queue")
+    sharded.add_argument("--areas", nargs='+', type=parse_area, default=None, metavar="AREA",
+                         help="delivery areas as <city>/<area>[:<geohash>], e.g. abu-dhabi/saadiyat:thqew2ggd3ss "
+                              "(@file reads them from a file, one per line)")
+    sharded.add_argument("--processes", type=int, default=1,
+                         help="worker processes pulling from the queue, at most --per-host; --rate is split between them")
+    sharded.add_argument("--max-pages", type=int, default=1, help="listing pages per area and cuisine")
+    sharded.add_argument("--queue", default=None, help="SQLite work queue (default: <state-dir>/queue.sqlite)")
+    sharded.add_argument("--lease-seconds", type=float, default=60.0,
+                         help="how long a worker holds a unit before another worker may take it over")
+    sharded.add_argument("--max-attempts", type=int, default=3, help="tries per page before giving up on it")
+    args = parser.parse_args(argv)
+    if args.per_listing is None:
+        args.per_listing = 0 if args.areas else 1
+    # each worker process has one request in flight, so the processes together must stay within --per-host
+    if args.areas and args.processes > args.per_host:
+        parser.error(f"--processes {args.processes} would put more than --per-host {args.per_host} requests "
+                     f"in flight to the same host; raise --per-host or use fewer processes")
+    return args
+
+
+def run_crawl(args):
+    if args.offline and not args.cache_dir:
+        raise SystemExit("--offline needs --cache-dir")
+    cache = HTTPCache(args.cache_dir, ttl=args.cache_ttl, offline=args.offline) if args.cache_dir else None
+
+    checkpoint = CrawlCheckpoint(args.output + '.checkpoint')
+    done_cuisines, done_restaurants, offsets, committed = checkpoint.load() if args.resume else (set(), [], None, False)
+    if committed:
+        # the output was already swapped in; only the crawl state was left to save
+        planner = CrawlPlanner(args.state_dir)
+        planner.restore(done_restaurants)
+        planner.save()
+        checkpoint.open(resume=True)
+        checkpoint.finish()
+        print(f"The previous crawl already finished. {len(planner.planned)} unique restaurants are in {args.output}.")
+        return
+    resume = args.resume
+    if offsets is not None and not all(os.path.exists(path + '.partial') for path in [args.output, args.delta_output]):
+        # resuming on top of a fresh partial file would commit a CSV without the finished restaurants
+        print("No partial output to resume from, starting over.")
+        resume, done_cuisines, done_restaurants, offsets = False, set(), [], None
+    if done_restaurants or done_cuisines:
+        print(f"Resuming: {len(done_cuisines)} cuisines and {len(done_restaurants)} restaurants already done.")
+
+    planner = CrawlPlanner(args.state_dir)
+    planner.restore(done_restaurants)
+    output = AtomicCSVWriter(args.output, CSV_HEADERS, offsets[0] if offsets else None)
+    delta = AtomicCSVWriter(args.delta_output, ['Change'] + CSV_HEADERS, offsets[1] if offsets else None)
+    checkpoint.open(resume=resume)
+
+    page_parser = PageParser(args.parser, processes=args.parse_processes)
+    cuisines = [cuisine for cuisine in CUISINE_LIST if cuisine not in done_cuisines]
+    events = crawl(cuisines, planner, workers=args.workers, max_per_host=args.per_host,
+                   rate=args.rate, base_url=args.base_url, cache=cache, parser=page_parser, limit=args.per_listing)
+
+    # streaming each restaurant's rows to disk as soon as its menu is in
+    for kind, subject, menu in events:
+        if kind == 'cuisine':
+            # restaurants relisted under this cuisine gained it after their own record was written
+            checkpoint.cuisine(subject, [planned['key'] for planned in planner.planned if subject in planned['cuisines']])
+            continue
+        if menu is not None:
+            output.write_rows(planner.rows_for(subject, menu))
+            delta.write_rows(planner.delta_for(subject, menu))
+            planner.stage(subject, menu)
+        checkpoint.restaurant(subject, [output.tell(), delta.tell()])
+    page_parser.close()
+
+    if cache is not None:
+        print(cache.summary())
+
+    # swapping the finished CSVs in place
+    output.commit()
+    delta.commit()
+    checkpoint.committed()
+    planner.save()
+    checkpoint.finish()
+    print(f"All data processed successfully. {len(planner.planned)} unique restaurants written to {args.output}.")
+
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with metrics.profiled('scrape'):
+        if args.areas:
+            run_sharded_crawl(args)
+        else:
+            run_crawl(args)
+    if args.metrics:
+        metrics.write(args.metrics)
+        print(f"Metrics written to {args.metrics}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import copy
+import threading
+
+import numpy as np
+
+# Protein minimums generate_meal_plan asks for (breakfast, lunch/dinner, snacks); other values still work
+DEFAULT_PROTEIN_LEVELS = (5, 15, 25)
+
+
+class MealIndex:
+    """
+    Candidate index for picking a random meal within a calorie range and
+    above a protein minimum, without scanning the whole catalogue.
+
+    For each protein level (plus one level holding every item) the index
+    keeps the qualifying items sorted by calories in NumPy arrays. A query
+    uses the highest level not above the requested protein minimum, finds
+    the calorie range with two binary searches and draws uniformly from it.
+    When the minimum falls between levels, the range is filtered on protein
+    before drawing, so every qualifying item is still equally likely.
+    """
+
+    def __init__(self, meal_data, protein_levels=DEFAULT_PROTEIN_LEVELS):
+        self.meal_data = meal_data
+        self.calories = meal_data['Calories'].to_numpy(dtype=np.float64)
+        self.protein = meal_data['Protein (g)'].to_numpy(dtype=np.float64)
+        self.max_calories = np.inf
+
+        self.levels = [self._build_level(level) for level in [-np.inf] + sorted(set(protein_levels))]
+        self._thresholds = np.array([level for level, _, _, _ in self.levels])
+        # levels / _thresholds never change after this, so threads can share the index;
+        # exact levels for other protein minimums are added to _exact on first use, under the lock
+        self._exact = {level[0]: level for level in self.levels}
+        self._lock = threading.Lock()
+
+    def _build_level(self, level):
+        rows = np.flatnonzero((self.protein >= level) & (self.calories <= self.max_calories))
+        rows = rows[np.argsort(self.calories[rows], kind='stable')]
+        return level, self.calories[rows], self.protein[rows], rows
+
+    def _exact_level(self, min_protein):
+        # vectorized picks need a level whose items all qualify, so build one on first use
+        level = self._exact.get(min_protein)
+        if level is None:
+            with self._lock:
+                level = self._exact.get(min_protein)
+                if level is None:
+                    level = self._exact[min_protein] = self._build_level(min_protein)
+        return level
+
+    def restrict(self, max_calories):
+        """
+        This index without the items above `max_calories`, for repeated
+        picks under one calorie ceiling (a plan never picks more than its
+        target). The levels are views of this index's arrays, so it costs a
+        few binary searches and no copies.
+        """
+        view = copy.copy(self)
+        view.max_calories = min(max_calories, self.max_calories)
+        view.levels = []
+        for level, calories, protein, rows in self.levels:
+            stop = np.searchsorted(calories, view.max_calories, 'right')
+            view.levels.append((level, calories[:stop], protein[:stop], rows[:stop]))
+        view._exact = {level[0]: level for level in view.levels}
+        view._lock = threading.Lock()
+        return view
+
+    def __len__(self):
+        return len(self.meal_data)
+
+    def select(self, max_calories, min_calories=-np.inf, min_protein=-np.inf, rng=None):
+        """
+        Return the row position of a uniformly chosen item with calories in
+        [min_calories, max_calories] and protein >= min_protein, or None if
+        no item qualifies.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        level, calories, protein, rows = self.levels[np.searchsorted(self._thresholds, min_protein, 'right') - 1]
+
+        start = np.searchsorted(calories, min_calories, 'left')
+        stop = np.searchsorted(calories, max_calories, 'right')
+        if start >= stop:
+            return None
+        if level == min_protein:
+            return rows[rng.integers(start, stop)]
+
+        candidates = np.flatnonzero(protein[start:stop] >= min_protein)
+        if len(candidates) == 0:
+            return None
+        return rows[start + candidates[rng.integers(len(candidates))]]
+
+    def select_many(self, max_calories, min_calories=-np.inf, min_protein=-np.inf, rng=None):
+        """
+        Vectorized `select`: one independent uniform pick per element of the
+        calorie bounds (arrays or scalars, broadcast together) under a single
+        protein minimum. Returns an int64 array of row positions, -1 where no
+        item qualifies.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        _, calories, _, rows = self._exact_level(min_protein)
+
+        start, stop = np.broadcast_arrays(np.searchsorted(calories, min_calories, 'left'),
+                                          np.searchsorted(calories, max_calories, 'right'))
+        found = start < stop
+        picks = np.full(start.shape, -1, dtype=np.int64)
+        picks[found] = rows[rng.integers(start[found], stop[found])]
+        return picks
+
+    def select_usable(self, usable, max_calories, min_calories=-np.inf, min_protein=-np.inf, rng=None, tries=8):
+        """
+        `select` among the qualifying rows for which `usable(rows)`, a
+        vectorized check returning a bool array, is True (e.g. items a
+        multi-day plan hasn't used yet). A few uniform draws from the range
+        are checked first, so blocking an item costs nothing up front; the
+        whole range is only checked when every draw hits a blocked item.
+        """
+        rng = rng if rng is not None else np.random.default_rng()
+        _, calories, _, rows = self._exact_level(min_protein)
+
+        start = np.searchsorted(calories, min_calories, 'left')
+        stop = np.searchsorted(calories, max_calories, 'right')
+        if start >= stop:
+            return None
+        draws = rows[rng.integers(start, stop, size=tries)]
+        found = usable(draws)
+        if found.any():
+            return draws[found.argmax()]
+
+        candidates = rows[start:stop]
+        candidates = candidates[usable(candidates)]
+        if len(candidates) == 0:
+            return None
+        return candidates[rng.integers(len(candidates))]
+
+    def count(self, max_calories, min_calories=-np.inf, min_protein=-np.inf):
+        level, calories, protein, rows = self.levels[np.searchsorted(self._thresholds, min_protein, 'right') - 1]
+        start = np.searchsorted(calories, min_calories, 'left')
+        stop = np.searchsorted(calories, max_calories, 'right')
+        if level == min_protein or start >= stop:
+            return max(0, stop - start)
+        return int(np.count_nonzero(protein[start:stop] >= min_protein))
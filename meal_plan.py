@@ -1,18 +1,48 @@
-import pandas as pd
+import argparse
+import threading
 
-# Load the CSV file
-file_path = 'restaurants_sample_with_nutrition.csv'  # Change this to the appropriate file name
-meal_data = pd.read_csv(file_path)
+import metrics
+from meal_rules import MEAL_SLOTS, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, SNACK_SLOTS, SNACK_UNTIL
 
-# Remove rows with missing or NaN values in essential columns
-meal_data = meal_data.dropna(subset=['Calories', 'Protein (g)'])
+# The catalogue (the compiled copy from catalogue.py when there is a fresh one, else the CSV)
+file_path = 'restaurants_sample_with_nutrition.csv'  # Change this to the appropriate file name
 
-# Convert 'Calories' and 'Protein (g)' to numeric, coercing errors to NaN
-meal_data['Calories'] = pd.to_numeric(meal_data['Calories'], errors='coerce')
-meal_data['Protein (g)'] = pd.to_numeric(meal_data['Protein (g)'], errors='coerce')
+# Loaded, indexed and solved over on first use, so importing this module stays cheap
+# (pandas and numpy are only imported then)
+meal_data = None
+meal_index = None
+meal_solver = None
+multi_day_planner = None
+default_rng = None
+_load_lock = threading.Lock()
 
-# Remove any rows where the conversion resulted in NaN
-meal_data = meal_data.dropna(subset=['Calories', 'Protein (g)'])
+def load_meal_data():
+    """
+    Load and index the catalogue at `file_path`, once per process.
+    
+    Safe to call from several threads; the first call does the work and
+    the others wait for it.
+    
+    Returns:
+    MealIndex: Calorie/protein index over the loaded catalogue
+    """
+    global meal_data, meal_index, default_rng
+    with _load_lock:
+        if meal_index is None:
+            import numpy as np
+            from catalogue import PLAN_COLUMNS, load_catalogue
+            from meal_index import MealIndex
+
+            data = load_catalogue(file_path, PLAN_COLUMNS)
+            # Make it visible when items are left out for missing nutrition info (e.g. "N/A" from macros.py)
+            if data.attrs['skipped']:
+                print(f"Note: {data.attrs['skipped']} of {data.attrs['source_rows']} menu items have no nutrition info and are skipped.")
+
+            # Index meals by calories and protein once, so each selection is a binary search
+            default_rng = np.random.default_rng()
+            meal_data = data
+            meal_index = MealIndex(data)
+        return meal_index
 
 def calculate_requirements(weight, height, age, gender, goal):
     """
@@ -55,40 +85,41 @@ def calculate_requirements(weight, height, age, gender, goal):
 
     return total_calories, protein_requirement
 
-def select_meal(remaining_calories, min_calories, min_protein):
+def select_meal(remaining_calories, min_calories, min_protein, index=None, rng=None):
     """
     Select a meal based on calorie and protein criteria.
     
-    This function filters the meal data based on the given criteria
-    and randomly selects a meal that fits within the constraints.
+    This function looks up the meals that fit within the constraints in
+    the calorie/protein index and randomly selects one of them.
     
     Args:
     remaining_calories (float): Remaining calories for the day
     min_calories (float): Minimum calories for the meal
     min_protein (float): Minimum protein for the meal
+    index (MealIndex): Index to select from (defaults to the loaded catalogue)
+    rng (np.random.Generator): Random generator, for reproducible plans
     
     Returns:
     pd.Series or None: Selected meal or None if no suitable meal found
     """
-    # Filter meals based on calorie and protein criteria
-    possible_meals = meal_data[
-        (meal_data['Calories'] <= remaining_calories) &
-        (meal_data['Calories'] >= min_calories) &
-        (meal_data['Protein (g)'] >= min_protein)
-    ]
+    index = index if index is not None else load_meal_data()
+    rng = rng if rng is not None else default_rng
+
+    # Pick among meals meeting the calorie and protein criteria
+    position = index.select(remaining_calories, min_calories, min_protein, rng)
     
     # If no meals meet the criteria, relax the protein requirement
-    if possible_meals.empty:
-        possible_meals = meal_data[meal_data['Calories'] <= remaining_calories]
+    if position is None:
+        position = index.select(remaining_calories, rng=rng)
     
     # If still no meals are found, return None
-    if possible_meals.empty:
+    if position is None:
         return None
     
-    # Randomly select a meal from the possible options
-    return possible_meals.sample(1).iloc[0]
+    return index.meal_data.iloc[position]
 
-def generate_meal_plan(total_calories, protein_requirement, goal):
+@metrics.timed('plan_seconds', solver='greedy')
+def generate_meal_plan(total_calories, protein_requirement, goal, index=None, rng=None):
     """
     Generating a full day's meal plan.
     
@@ -100,6 +131,8 @@ def generate_meal_plan(total_calories, protein_requirement, goal):
     total_calories (float): Total calories for the day
     protein_requirement (float): Protein requirement for the day
     goal (str): User's fitness goal
+    index (MealIndex): Index to select from (defaults to the loaded catalogue)
+    rng (np.random.Generator): Random generator, for reproducible plans
     
     Returns:
     tuple: (selected_meals, total_calories_consumed, total_protein_consumed)
@@ -109,21 +142,20 @@ def generate_meal_plan(total_calories, protein_requirement, goal):
     total_protein_consumed = 0
 
     # Select meals for breakfast, lunch, and dinner
-    for meal_type in ["breakfast", "lunch", "dinner"]:
+    for meal_type, min_calories, min_protein in MEAL_SLOTS:
         remaining_calories = total_calories - total_calories_consumed
-        min_calories = min(300, remaining_calories)
-        min_protein = 15 if meal_type == "breakfast" else 25
+        min_calories = min(min_calories, remaining_calories)
 
-        meal = select_meal(remaining_calories, min_calories, min_protein)
+        meal = select_meal(remaining_calories, min_calories, min_protein, index, rng)
         if meal is not None:
             selected_meals[meal_type].append(meal)
             total_calories_consumed += meal['Calories']
             total_protein_consumed += meal['Protein (g)']
 
     # Add snacks if there's room in the calorie budget
-    while total_calories_consumed < total_calories * 0.9 and len(selected_meals['snacks']) < 2:
+    while total_calories_consumed < total_calories * SNACK_UNTIL and len(selected_meals['snacks']) < SNACK_SLOTS:
         remaining_calories = total_calories - total_calories_consumed
-        snack = select_meal(remaining_calories, 100, 5)
+        snack = select_meal(remaining_calories, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, index, rng)
         if snack is not None:
             selected_meals['snacks'].append(snack)
             total_calories_consumed += snack['Calories']
@@ -133,39 +165,104 @@ def generate_meal_plan(total_calories, protein_requirement, goal):
 
     return selected_meals, total_calories_consumed, total_protein_consumed
 
-def run_user_info(name, age, weight, height, gender, goal):
+@metrics.timed('plan_seconds', solver='optimal')
+def solve_meal_plan(total_calories, protein_requirement, goal, solver=None, tolerance=0.1, max_fat=None, max_carbs=None):
     """
-    This function calculates the requirements, generates a meal plan,
-    and prints the results for a given set of user parameters.
+    Solving for the best full day's meal plan.
+    
+    Instead of picking meals at random, this function searches for the
+    breakfast, lunch, dinner and up to two snacks that come closest to
+    the calorie target (within the tolerance) while meeting the protein
+    requirement and any fat/carb limits.
+    
+    Args:
+    total_calories (float): Total calories for the day
+    protein_requirement (float): Protein requirement for the day
+    goal (str): User's fitness goal
+    solver (MealSolver): Solver to use (defaults to one over the loaded catalogue)
+    tolerance (float): Accepted calorie deviation, as a share of the target
+    max_fat (float): Optional daily fat limit in grams
+    max_carbs (float): Optional daily carb limit in grams
+    
+    Returns:
+    tuple: (selected_meals, total_calories_consumed, total_protein_consumed)
     """
+    global meal_solver
+    if solver is None:
+        load_meal_data()
+        with _load_lock:
+            if meal_solver is None:
+                # The optimizing solver is built on first use, since the greedy planner doesn't need it
+                from meal_solver import MealSolver
+                meal_solver = MealSolver(meal_data.reset_index(drop=True))
+        solver = meal_solver
+
+    plan = solver.solve(total_calories, protein_requirement, tolerance, max_fat, max_carbs)
+    slots = ["breakfast", "lunch", "dinner", "snacks", "snacks"]
+    selected_meals = {"breakfast": [], "lunch": [], "dinner": [], "snacks": []}
+    for meal_type, position in zip(slots, plan['picks']):
+        if position >= 0:
+            selected_meals[meal_type].append(solver.meal_data.iloc[position])
 
-    # mapping the integer-coded goal back to its corresponding string
-    if goal == 1:
-        goal_str = 'gain muscle'
-    elif goal == 2:
-        goal_str = 'lose weight'
-    elif goal == 3:
-        goal_str = 'maintain weight'
-
-
-    print(f"\nGenerating {name}'s meal plan!\n")
-    print(f"Age: {age}, Weight: {weight}kg, Height: {height}cm, Gender: {gender}, Goal: {goal_str}")
-
-    # calling calculate_requirements with the string representation of the goal
-    total_calories, protein_requirement = calculate_requirements(weight, height, age, gender, goal_str)
-    print(f"Calorie requirement: {total_calories:.2f} calories")
-    print(f"Protein requirement: {protein_requirement:.2f} grams")
+    return selected_meals, plan['calories'], plan['protein']
 
-    # generating meal plan based on the total calories and protein requirement
-    meal_plan, total_calories_consumed, total_protein_consumed = generate_meal_plan(total_calories, protein_requirement, goal_str)
+@metrics.timed('plan_seconds', solver='multi_day')
+def generate_multi_day_plan(total_calories, protein_requirement, goal, days, item_gap=7, per_restaurant=1,
+                            planner=None, rng=None):
+    """
+    Generating meal plans for several days at once.
+    
+    Each day is picked with the same rules as generate_meal_plan, while
+    keeping variety across the days: a menu item is not repeated within
+    `item_gap` days, and no restaurant serves more than `per_restaurant`
+    meals in one day.
     
+    Args:
+    total_calories (float): Total calories per day
+    protein_requirement (float): Protein requirement per day
+    goal (str): User's fitness goal
+    days (int): Number of days to plan
+    item_gap (int): Days before a menu item may be used again (7: no item twice per week)
+    per_restaurant (int): Most meals per day from one restaurant
+    planner (MultiDayPlanner): Planner to use (defaults to one over the loaded catalogue)
+    rng (np.random.Generator): Random generator, for reproducible plans
+    
+    Returns:
+    list: one (selected_meals, total_calories_consumed, total_protein_consumed) tuple per day
+    """
+    global multi_day_planner
+    if planner is None:
+        load_meal_data()
+        with _load_lock:
+            if multi_day_planner is None:
+                from multi_day import MultiDayPlanner
+                multi_day_planner = MultiDayPlanner(meal_index)
+        planner = multi_day_planner
+
+    picks, calories, protein = planner.plan(total_calories, days, item_gap, per_restaurant,
+                                            rng if rng is not None else default_rng)
+    slots = ["breakfast", "lunch", "dinner", "snacks", "snacks"]
+    plans = []
+    for day_picks, day_calories, day_protein in zip(picks, calories, protein):
+        selected_meals = {"breakfast": [], "lunch": [], "dinner": [], "snacks": []}
+        for meal_type, position in zip(slots, day_picks):
+            if position >= 0:
+                selected_meals[meal_type].append(planner.index.meal_data.iloc[position])
+        plans.append((selected_meals, float(day_calories), float(day_protein)))
+    return plans
+
+def print_meal_plan(meal_plan, total_calories_consumed, total_protein_consumed, total_calories, protein_requirement):
+    """
+    Print one day's meals and how its totals compare to the targets.
+    """
     print("\nMeal Plan:")
     for meal_time, meals in meal_plan.items():
         print(f"  {meal_time.capitalize()}:")
         for meal in meals:
             print(f"    {meal['Menu Item']} from {meal['Restaurant Name']}")
             print(f"      Calories: {meal['Calories']:.0f}, Protein: {meal['Protein (g)']:.1f}g")
-            if 'Link' in meal and pd.notna(meal['Link']) and meal['Link']:
+            # a missing link is NaN
+            if isinstance(meal.get('Link'), str) and meal['Link']:
                 print(f"      Order here: {meal['Link']}")
 
     print(f"\nTotal calories: {total_calories_consumed:.2f}")
@@ -188,7 +285,73 @@ def run_user_info(name, age, weight, height, gender, goal):
     else:
         print(f"Meal plan is {-protein_diff:.2f} grams short of protein target.")
 
-def main():
+def run_user_info(name, age, weight, height, gender, goal, solver='greedy', tolerance=0.1, max_fat=None, max_carbs=None,
+                  days=1, item_gap=7, per_restaurant=1):
+    """
+    This function calculates the requirements, generates a meal plan,
+    and prints the results for a given set of user parameters.
+    With solver='optimal' the plan is solved for instead of drawn at random,
+    and with days > 1 a plan with variety across the days is printed per day.
+    """
+
+    # mapping the integer-coded goal back to its corresponding string
+    if goal == 1:
+        goal_str = 'gain muscle'
+    elif goal == 2:
+        goal_str = 'lose weight'
+    elif goal == 3:
+        goal_str = 'maintain weight'
+
+
+    print(f"\nGenerating {name}'s meal plan!\n")
+    print(f"Age: {age}, Weight: {weight}kg, Height: {height}cm, Gender: {gender}, Goal: {goal_str}")
+
+    # calling calculate_requirements with the string representation of the goal
+    total_calories, protein_requirement = calculate_requirements(weight, height, age, gender, goal_str)
+    print(f"Calorie requirement: {total_calories:.2f} calories")
+    print(f"Protein requirement: {protein_requirement:.2f} grams")
+
+    # generating meal plan based on the total calories and protein requirement
+    if days > 1:
+        plans = generate_multi_day_plan(total_calories, protein_requirement, goal_str, days, item_gap, per_restaurant)
+        for day, (meal_plan, total_calories_consumed, total_protein_consumed) in enumerate(plans, 1):
+            print(f"\n=== Day {day} ===")
+            print_meal_plan(meal_plan, total_calories_consumed, total_protein_consumed, total_calories, protein_requirement)
+        return
+    if solver == 'optimal':
+        meal_plan, total_calories_consumed, total_protein_consumed = solve_meal_plan(
+            total_calories, protein_requirement, goal_str, tolerance=tolerance, max_fat=max_fat, max_carbs=max_carbs)
+    else:
+        meal_plan, total_calories_consumed, total_protein_consumed = generate_meal_plan(total_calories, protein_requirement, goal_str)
+    print_meal_plan(meal_plan, total_calories_consumed, total_protein_consumed, total_calories, protein_requirement)
+
+def main(argv=None):
+    global file_path
+    parser = argparse.ArgumentParser(description="Interactive meal plan generator.")
+    parser.add_argument("--solver", choices=['greedy', 'optimal'], default='greedy',
+                        help="pick meals at random (greedy) or solve for the plan closest to the targets")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="accepted calorie deviation for --solver optimal")
+    parser.add_argument("--max-fat", type=float, default=None, help="daily fat limit in grams for --solver optimal")
+    parser.add_argument("--max-carbs", type=float, default=None, help="daily carb limit in grams for --solver optimal")
+    parser.add_argument("--days", type=int, default=1, help="plan this many days at once, with variety across them")
+    parser.add_argument("--item-gap", type=int, default=7,
+                        help="with --days, days before a menu item may come back (7: no item twice per week)")
+    parser.add_argument("--per-restaurant", type=int, default=1,
+                        help="with --days, most meals per day from one restaurant")
+    parser.add_argument("--catalogue", default=None, help=f"enriched catalogue CSV (default: {file_path})")
+    parser.add_argument("--metrics", default=None,
+                        help="write run metrics here at the end (.prom for Prometheus text, otherwise JSON)")
+    args = parser.parse_args(argv)
+    if args.days > 1 and args.solver != 'greedy':
+        parser.error("--days plans with the greedy solver only")
+    if args.days < 1 or args.item_gap < 1 or args.per_restaurant < 1:
+        parser.error("--days, --item-gap and --per-restaurant must be at least 1")
+
+    if args.catalogue:
+        file_path = args.catalogue
+    # load the catalogue while the user types, so the plan is ready right after the last answer
+    threading.Thread(target=load_meal_data, daemon=True).start()
+
     print("Welcome to the Meal Plan Generator!")
 
     '''
@@ -256,7 +419,11 @@ def main():
             print("Invalid input! Please enter a valid number (1, 2, or 3).")
 
     # Call the function to run the meal plan generator with the user's inputs
-    run_user_info(name, age, weight, height, gender, goal)
+    with metrics.profiled('plan'):
+        run_user_info(name, age, weight, height, gender, goal, args.solver, args.tolerance, args.max_fat, args.max_carbs,
+                      args.days, args.item_gap, args.per_restaurant)
+    if args.metrics:
+        metrics.write(args.metrics)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
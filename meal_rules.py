@@ -0,0 +1,13 @@
+"""
+What goes into one day's plan, shared by every planner: the greedy
+meal_plan.generate_meal_plan, the cohort planner in batch_plan.py, the
+multi-day planner and the optimizing MealSolver.
+"""
+
+# (slot, minimum calories, minimum protein) for the main meals, in order
+MEAL_SLOTS = [('breakfast', 300, 15), ('lunch', 300, 25), ('dinner', 300, 25)]
+# Up to this many snacks, while the day is still under SNACK_UNTIL of its calorie target
+SNACK_SLOTS = 2
+SNACK_MIN_CALORIES = 100
+SNACK_MIN_PROTEIN = 5
+SNACK_UNTIL = 0.9
@@ -0,0 +1,242 @@
+"""
+Optimizing alternative to the greedy, random generate_meal_plan.
+
+`MealSolver.solve` picks the breakfast, lunch, dinner and up to two snacks
+that best meet a calorie target (within a tolerance) and a protein
+minimum, optionally under daily fat and carb limits. It is a knapsack DP
+over calorie buckets (`resolution` calories wide):
+
+- Each slot's candidates are pruned once, up front, to the frontier of
+  each calorie bucket, i.e. the items with the most protein for their
+  calories. Everything else is dominated, so the DP only sees a few
+  hundred candidates per slot however large the catalogue is.
+- Slots that draw from the same pool (lunch and dinner, the two snacks)
+  are filled together as a 0/1 knapsack with an item count, so a plan
+  never repeats a dish within a pool. Repeats across pools (a breakfast
+  that would also be lunch) are excluded from the later group and the
+  plan re-solved, until no dish repeats.
+- For every reachable calorie bucket, the DP keeps the highest-protein way
+  to fill the slots so far, then scores the reachable day totals and
+  backtracks the best one.
+- Fat and carb limits are folded into the value as Lagrangian penalties
+  (protein - l_fat * fat - l_carbs * carbs). The multipliers are raised
+  until the plan fits the limits, and the best-scoring plan seen is kept.
+"""
+import numpy as np
+
+from meal_rules import MEAL_SLOTS, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, SNACK_SLOTS
+
+NUTRIENTS = ['calories', 'protein', 'fat', 'carbs']
+LAGRANGE_ROUNDS = 8
+
+
+class MealSolver:
+    """
+    Solver over one catalogue. Candidate pruning happens on first use of
+    each slot pool and multiplier pair and is cached, so repeated solves
+    only pay for the DP.
+    """
+
+    def __init__(self, meal_data, resolution=10):
+        self.meal_data = meal_data
+        self.resolution = resolution
+        self.calories = meal_data['Calories'].to_numpy(dtype=np.float64)
+        self.protein = meal_data['Protein (g)'].to_numpy(dtype=np.float64)
+        self.fat = self._optional_column('Fat (g)')
+        self.carbs = self._optional_column('Carbs (g)')
+        self.buckets = np.rint(self.calories / resolution).astype(np.int64)
+        missing = np.zeros(len(self.calories))
+        self.nutrients = np.stack([self.calories, self.protein,
+                                   self.fat if self.fat is not None else missing,
+                                   self.carbs if self.carbs is not None else missing])
+
+        # (pool, items, optional) per group of slots, with the minimums generate_meal_plan asks for
+        rules = {name: (min_calories, min_protein) for name, min_calories, min_protein in MEAL_SLOTS}
+        self.groups = [('breakfast', 1, False), ('lunch', 2, False), ('snacks', SNACK_SLOTS, True)]
+        self.pools = {pool: self._pool(*rules[pool]) for pool, _, _ in self.groups[:2]}
+        self.pools['snacks'] = self._pool(SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN)
+        self._pruned = {}
+
+    def _optional_column(self, column):
+        if column not in self.meal_data:
+            return None
+        return self.meal_data[column].fillna(0).to_numpy(dtype=np.float64)
+
+    def _pool(self, min_calories, min_protein):
+        rows = np.flatnonzero((self.calories >= min_calories) & (self.protein >= min_protein))
+        # relax the minimums when nothing meets them, as select_meal does
+        return rows if len(rows) else np.arange(len(self.calories))
+
+    def _value(self, rows, lambda_fat, lambda_carbs):
+        value = self.protein[rows].copy()
+        if lambda_fat:
+            value -= lambda_fat * self.fat[rows]
+        if lambda_carbs:
+            value -= lambda_carbs * self.carbs[rows]
+        return value
+
+    def candidates(self, pool, keep=1, lambda_fat=0.0, lambda_carbs=0.0, excluded=None):
+        """
+        Rows of `pool` on the frontier of their calorie bucket: the `keep`
+        highest-value items of each bucket (a group of n slots can use at
+        most n from one bucket), sorted by bucket. Rows in `excluded` are
+        left out before pruning, so the next-best item of their bucket
+        takes their place.
+        """
+        if excluded:
+            rows = self.pools[pool]
+            return self._frontier(rows[~np.isin(rows, list(excluded))], keep, lambda_fat, lambda_carbs)
+        key = (pool, keep, lambda_fat, lambda_carbs)
+        if key not in self._pruned:
+            self._pruned[key] = self._frontier(self.pools[pool], keep, lambda_fat, lambda_carbs)
+        return self._pruned[key]
+
+    def _frontier(self, rows, keep, lambda_fat, lambda_carbs):
+        order = np.lexsort((-self._value(rows, lambda_fat, lambda_carbs), self.buckets[rows]))
+        rows = rows[order]
+        buckets = self.buckets[rows]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        rank = np.arange(len(rows)) - np.repeat(starts, np.diff(np.r_[starts, len(rows)]))
+        return rows[rank < keep]
+
+    def solve(self, total_calories, protein_requirement, tolerance=0.1, max_fat=None, max_carbs=None):
+        """
+        Find the best plan for one day.
+
+        Args:
+        total_calories (float): Calorie target for the day
+        protein_requirement (float): Protein minimum for the day
+        tolerance (float): Accepted calorie deviation, as a share of the target
+        max_fat (float): Optional daily fat limit in grams
+        max_carbs (float): Optional daily carb limit in grams
+
+        Returns:
+        dict: 'picks' (catalogue rows for breakfast, lunch, dinner and the
+        snacks, -1 for an unused snack), the day's 'calories', 'protein',
+        'fat' and 'carbs', and its 'penalty' (0 when every target is met)
+        """
+        if (max_fat is not None and self.fat is None) or (max_carbs is not None and self.carbs is None):
+            raise ValueError("fat/carb limits need 'Fat (g)' and 'Carbs (g)' columns in the catalogue")
+
+        limits = (total_calories, protein_requirement, tolerance, max_fat, max_carbs)
+        best = None
+        lambda_fat = lambda_carbs = 0.0
+        for _ in range(LAGRANGE_ROUNDS):
+            plan = self._solve_without_repeats(limits, lambda_fat, lambda_carbs)
+            if best is None or plan['penalty'] < best['penalty']:
+                best = plan
+            fat_over = max_fat is not None and plan['fat'] > max_fat
+            carbs_over = max_carbs is not None and plan['carbs'] > max_carbs
+            if not (fat_over or carbs_over):
+                break
+            # protein per gram is the natural scale; double until the limit binds
+            if fat_over:
+                lambda_fat = lambda_fat * 2 if lambda_fat else 0.25
+            if carbs_over:
+                lambda_carbs = lambda_carbs * 2 if lambda_carbs else 0.25
+        return best
+
+    def _solve_without_repeats(self, limits, lambda_fat, lambda_carbs):
+        # pools overlap (a high-protein breakfast also qualifies as lunch), so exclude repeats from later groups;
+        # every round excludes at least one more row, so this ends
+        excluded = [set() for _ in self.groups]
+        while True:
+            plan = self._solve_once(limits, lambda_fat, lambda_carbs, excluded)
+            seen = set()
+            repeated = False
+            for group, rows in enumerate(plan.pop('groups')):
+                repeats = seen.intersection(rows)
+                if repeats:
+                    excluded[group].update(repeats)
+                    repeated = True
+                seen.update(rows)
+            if not repeated:
+                return plan
+
+    def _solve_once(self, limits, lambda_fat, lambda_carbs, excluded):
+        total_calories, protein_requirement, tolerance, max_fat, max_carbs = limits
+        group_candidates = []
+        for group, (pool, count, optional) in enumerate(self.groups):
+            group_candidates.append(self.candidates(pool, count, lambda_fat, lambda_carbs, excluded[group]))
+
+        # states above the tolerance band are only needed when the required meals alone overshoot it
+        cheapest = sum(np.sort(self.buckets[rows])[:count].sum()
+                       for rows, (_, count, optional) in zip(group_candidates, self.groups) if not optional)
+        cap = max(int(np.ceil(total_calories * (1 + tolerance) / self.resolution)), int(cheapest))
+
+        value = np.full(cap + 1, -np.inf)
+        value[0] = 0.0
+        totals = np.zeros((len(NUTRIENTS), cap + 1))
+        layers = []
+        for rows, (_, count, optional) in zip(group_candidates, self.groups):
+            rows = rows[self.buckets[rows] <= cap]
+            value, totals, layer = self._knapsack(value, totals, rows, count, optional, lambda_fat, lambda_carbs)
+            layers.append(layer)
+
+        totals = dict(zip(NUTRIENTS, totals))
+        penalty = self._penalty(totals, total_calories, protein_requirement, tolerance, max_fat, max_carbs)
+        # among equally good plans, prefer the one closest to the calorie target
+        rank = penalty + 1e-3 * np.abs(totals['calories'] - total_calories) / total_calories
+        rank[value == -np.inf] = np.inf
+        end = state = int(rank.argmin())
+
+        groups = []
+        for rows, weights, took, counts in reversed(layers):
+            picked = []
+            items = counts[state]
+            for candidate in range(len(rows) - 1, -1, -1):
+                if items and took[candidate, items - 1, state]:
+                    picked.append(int(rows[candidate]))
+                    state -= weights[candidate]
+                    items -= 1
+            groups.append(picked)
+        groups.reverse()
+
+        picks = []
+        for picked, (_, count, _) in zip(groups, self.groups):
+            picked = sorted(picked, key=lambda row: self.calories[row])
+            picks += picked + [-1] * (count - len(picked))
+
+        plan = {name: float(column[end]) for name, column in totals.items()}
+        plan.update(picks=picks, penalty=float(penalty[end]), groups=groups)
+        return plan
+
+    def _knapsack(self, value, totals, rows, count, optional, lambda_fat, lambda_carbs):
+        """
+        Add one group of slots to the DP: choose `count` distinct rows (up
+        to `count` when optional) as a 0/1 knapsack over calorie buckets.
+        """
+        weights = self.buckets[rows]
+        values = self._value(rows, lambda_fat, lambda_carbs)
+        nutrients = self.nutrients[:, rows]
+        width = len(value)
+
+        # by_count[k, s]: best value at state s with k items of this group taken so far
+        by_count = np.full((count + 1, width), -np.inf)
+        by_count[0] = value
+        group_totals = np.zeros((len(NUTRIENTS), count + 1, width))
+        group_totals[:, 0] = totals
+        took = np.zeros((len(rows), count, width), dtype=bool)
+        for candidate, weight in enumerate(weights):
+            added = by_count[:-1, :width - weight] + values[candidate]
+            better = added > by_count[1:, weight:]
+            np.copyto(group_totals[:, 1:, weight:],
+                      group_totals[:, :-1, :width - weight] + nutrients[:, candidate, None, None], where=better)
+            np.copyto(by_count[1:, weight:], added, where=better)
+            took[candidate, :, weight:] = better
+
+        counts = by_count.argmax(axis=0) if optional else np.full(width, count)
+        states = np.arange(width)
+        return by_count[counts, states], group_totals[:, counts, states], (rows, weights, took, counts)
+
+    @staticmethod
+    def _penalty(totals, total_calories, protein_requirement, tolerance, max_fat, max_carbs):
+        # relative misses of each target beyond what is allowed
+        miss = np.abs(totals['calories'] - total_calories) / total_calories
+        penalty = np.maximum(miss - tolerance, 0)
+        penalty += np.maximum(protein_requirement - totals['protein'], 0) / max(protein_requirement, 1)
+        if max_fat is not None:
+            penalty += np.maximum(totals['fat'] - max_fat, 0) / max(max_fat, 1)
+        if max_carbs is not None:
+            penalty += np.maximum(totals['carbs'] - max_carbs, 0) / max(max_carbs, 1)
+        return penalty
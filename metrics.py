@@ -0,0 +1,229 @@
+"""
+Run metrics shared by the scraper, the enrichment and the planner.
+
+Counters and histograms live in one process-wide registry and are keyed by
+name and labels. At the end of a run they are written as a Prometheus text
+file (.prom or .txt) or a JSON summary (anything else). Names get the
+`gigachad_` prefix on export.
+
+    metrics.inc('pages_parsed_total', kind='menu')
+    with metrics.timer('http_request_seconds', host=host):
+        ...
+    metrics.write('crawl.prom')
+
+Setting GIGACHAD_PROFILE=cpu, memory or cpu,memory turns on cProfile and/or
+tracemalloc around a stage wrapped in `profiled(stage)`. The reports go to
+GIGACHAD_PROFILE_DIR (default: the current directory).
+"""
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+from fileutil import atomic_write
+
+PREFIX = 'gigachad_'
+# Seconds, from a cache lookup up to a slow LLM call
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PROFILE_ENV = 'GIGACHAD_PROFILE'
+PROFILE_DIR_ENV = 'GIGACHAD_PROFILE_DIR'
+
+
+def _key(name, labels):
+    return name, tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+
+def _label_text(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in labels) + '}'
+
+
+def _escape(value):
+    # label values escape backslash, double quote and newline in the text format
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Registry:
+    """Thread-safe store of counters, gauges and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.started = time.time()
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                    'count': 0, 'sum': 0.0, 'min': value, 'max': value}
+            for i, bound in enumerate(histogram['buckets']):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += value
+            histogram['min'] = min(histogram['min'], value)
+            histogram['max'] = max(histogram['max'], value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of `timer`."""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, **labels):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def prometheus(self):
+        """Everything recorded so far, in the Prometheus text exposition format."""
+        with self._lock:
+            lines = []
+            for kind, series in [('counter', self.counters), ('gauge', self.gauges)]:
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f"# TYPE {PREFIX}{name} {kind}")
+                    for (series_name, labels), value in sorted(series.items()):
+                        if series_name == name:
+                            lines.append(f"{PREFIX}{name}{_label_text(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (series_name, labels), histogram in sorted(self.histograms.items()):
+                    if series_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram['buckets'], histogram['counts']):
+                        cumulative += count
+                        lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{PREFIX}{name}_bucket{_label_text(labels, [('le', '+Inf')])} {histogram['count']}")
+                    lines.append(f"{PREFIX}{name}_sum{_label_text(labels)} {histogram['sum']}")
+                    lines.append(f"{PREFIX}{name}_count{_label_text(labels)} {histogram['count']}")
+            lines.append(f"# TYPE {PREFIX}run_seconds gauge")
+            lines.append(f"{PREFIX}run_seconds {time.time() - self.started}")
+            return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        JSON-ready summary: counter totals with their rate over the run,
+        gauges, and per histogram the count, sum, mean, min, max and
+        bucket-estimated p50/p90/p99.
+        """
+        elapsed = time.time() - self.started
+        with self._lock:
+            return {
+                'run_seconds': elapsed,
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value,
+                              'per_second': value / elapsed if elapsed else 0.0}
+                             for (name, labels), value in sorted(self.counters.items())],
+                'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                           for (name, labels), value in sorted(self.gauges.items())],
+                'histograms': [dict({'name': name, 'labels': dict(labels), 'count': histogram['count'],
+                                     'sum': histogram['sum'], 'mean': histogram['sum'] / histogram['count'],
+                                     'min': histogram['min'], 'max': histogram['max']},
+                                    **{f'p{q}': _quantile(histogram, q / 100) for q in (50, 90, 99)})
+                               for (name, labels), histogram in sorted(self.histograms.items())],
+            }
+
+    def write(self, path):
+        if path.endswith(('.prom', '.txt')):
+            atomic_write(path, self.prometheus())
+        else:
+            atomic_write(path, json.dumps(self.summary(), indent=2))
+
+
+def _quantile(histogram, q):
+    # linear interpolation inside the bucket holding the q-th observation, clamped to what was seen
+    rank = q * histogram['count']
+    cumulative = 0
+    lower = 0.0
+    for bound, count in zip(histogram['buckets'], histogram['counts']):
+        if count and cumulative + count >= rank:
+            estimate = lower + (bound - lower) * (rank - cumulative) / count
+            return min(max(estimate, histogram['min']), histogram['max'])
+        cumulative += count
+        lower = bound
+    return histogram['max']
+
+
+REGISTRY = Registry()
+inc = REGISTRY.inc
+gauge = REGISTRY.gauge
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+write = REGISTRY.write
+
+
+@contextlib.contextmanager
+def profiled(stage):
+    """
+    Run a stage under cProfile and/or tracemalloc when GIGACHAD_PROFILE asks
+    for it; otherwise do nothing.
+    """
+    modes = {mode.strip() for mode in os.environ.get(PROFILE_ENV, '').lower().split(',') if mode.strip()}
+    if not modes:
+        yield
+        return
+
+    directory = os.environ.get(PROFILE_DIR_ENV, '.')
+    os.makedirs(directory, exist_ok=True)
+    profiler = cProfile.Profile() if modes & {'cpu', '1', 'true'} else None
+    if 'memory' in modes:
+        tracemalloc.start(25)
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            path = os.path.join(directory, f'{stage}.prof')
+            profiler.dump_stats(path)
+            print(f"CPU profile written to {path} (top functions by cumulative time):", file=sys.stderr)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(15)
+        if 'memory' in modes:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            REGISTRY.gauge('tracemalloc_peak_bytes', peak, stage=stage)
+            path = os.path.join(directory, f'{stage}.tracemalloc.txt')
+            top = snapshot.statistics('lineno')[:25]
+            with open(path, 'w', encoding='utf-8') as file:
+                file.write(f"peak traced memory: {peak / 1e6:.1f} MB\n")
+                file.writelines(f"{stat}\n" for stat in top)
+            print(f"Memory profile written to {path} (peak {peak / 1e6:.1f} MB)", file=sys.stderr)
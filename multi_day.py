@@ -0,0 +1,149 @@
+"""
+Meal plans for several days at once, with variety rules.
+
+`MultiDayPlanner.plan_many` fills breakfast, lunch, dinner and the snacks
+for each of N days and a whole batch of users, with the same rules as
+meal_plan.generate_meal_plan, and on top of that:
+
+- a menu item (by normalized name, whichever restaurant serves it) is not
+  used again within `item_gap` days: 7 means no item twice per week, and
+  the horizon means never twice in the plan,
+- at most `per_restaurant` meals per day come from one restaurant.
+
+Used items are never filtered out of the catalogue. Each user carries the
+item codes picked over the last `item_gap` days in a small ring of days,
+and the day that falls out of the window is simply cleared. As in
+batch_plan.plan_cohort, each slot is filled for every user in lockstep: a
+few candidates per user are drawn from the slot's calorie range in the
+MealIndex, and the first one not blocked by the ring or by today's
+restaurants is taken. Only users whose draws are all blocked fall back to
+checking their whole range (`MealIndex.select_usable`).
+"""
+import numpy as np
+import pandas as pd
+
+from meal_rules import MEAL_SLOTS, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, SNACK_SLOTS, SNACK_UNTIL
+from nutrition_cache import normalize
+
+DEFAULT_ITEM_GAP = 7
+DEFAULT_PER_RESTAURANT = 1
+# candidates drawn per user and slot before falling back to the whole range
+DRAWS = 8
+
+
+class MultiDayPlanner:
+    """
+    Multi-day planner over one MealIndex. Item and restaurant codes are
+    computed once here; each plan only allocates its own small state.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        meal_data = index.meal_data
+        self.item_codes, _ = pd.factorize(meal_data['Menu Item'].astype(str).map(normalize))
+        self.restaurant_codes, _ = pd.factorize(meal_data['Restaurant Name'].astype(str))
+
+    def plan(self, total_calories, days, item_gap=DEFAULT_ITEM_GAP, per_restaurant=DEFAULT_PER_RESTAURANT, rng=None):
+        """
+        `plan_many` for one user: returns (picks, calories, protein) with
+        picks as a (days, slots) array and per-day totals.
+        """
+        picks, calories, protein = self.plan_many(np.array([total_calories], dtype=np.float64), days, item_gap,
+                                                  per_restaurant, rng)
+        return picks[0], calories[0], protein[0]
+
+    def plan_many(self, total_calories, days, item_gap=DEFAULT_ITEM_GAP, per_restaurant=DEFAULT_PER_RESTAURANT, rng=None):
+        """
+        Plan `days` days for a batch of users at once.
+
+        Args:
+        total_calories (np.ndarray): Calorie target per day, per user
+        days (int): Number of days
+        item_gap (int): Days before a menu item may be used again
+        per_restaurant (int): Most meals per day from one restaurant
+        rng (np.random.Generator): Random generator, for reproducible plans
+
+        Returns:
+        tuple: (picks, calories, protein), where picks is a (users, days,
+        slots) array of catalogue row positions (-1 for an empty slot;
+        slots are breakfast, lunch, dinner and then the snacks) and
+        calories and protein are (users, days) totals
+        """
+        if days < 1 or item_gap < 1 or per_restaurant < 1:
+            raise ValueError("days, item_gap and per_restaurant must be at least 1")
+        rng = rng if rng is not None else np.random.default_rng()
+        users = len(total_calories)
+        slots = len(MEAL_SLOTS) + SNACK_SLOTS
+        picks = np.full((users, days, slots), -1, dtype=np.int64)
+        calories = np.zeros((users, days))
+        protein = np.zeros((users, days))
+        # item codes of the last `window` days, one row of slots per day (-1 where nothing was picked)
+        window = min(item_gap, days)
+        recent = np.full((users, window, slots), -1, dtype=np.int64)
+
+        everyone = np.arange(users)
+        for day in range(days):
+            # the day leaving the ring is item_gap days back, so its items are usable again
+            recent[:, day % window] = -1
+            state = (day, window, recent, picks, per_restaurant)
+
+            for slot, (_, min_calories, min_protein) in enumerate(MEAL_SLOTS):
+                remaining = total_calories - calories[:, day]
+                chosen = self._pick(everyone, remaining, np.minimum(min_calories, remaining), min_protein, rng, state)
+                self._take(everyone, slot, chosen, state, calories, protein)
+
+            # snacks go to users still under 90% of their target; a user without a fitting snack gets no more
+            snacking = everyone
+            for slot in range(len(MEAL_SLOTS), slots):
+                snacking = snacking[calories[snacking, day] < total_calories[snacking] * SNACK_UNTIL]
+                remaining = total_calories[snacking] - calories[snacking, day]
+                chosen = self._pick(snacking, remaining, SNACK_MIN_CALORIES, SNACK_MIN_PROTEIN, rng, state)
+                snacking = snacking[self._take(snacking, slot, chosen, state, calories, protein)]
+
+        return picks, calories, protein
+
+    def _usable(self, users, rows, state):
+        # rows: (len(users), candidates) catalogue positions, -1 for none
+        day, window, recent, picks, per_restaurant = state
+        repeated = (self.item_codes[rows][:, :, None, None] == recent[users][:, None]).any(axis=(2, 3))
+        today = picks[users, day]
+        served = ((self.restaurant_codes[rows][:, :, None] == self.restaurant_codes[today][:, None]) &
+                  (today >= 0)[:, None]).sum(axis=2)
+        return (rows >= 0) & ~repeated & (served < per_restaurant)
+
+    def _draw(self, users, remaining, min_calories, min_protein, rng, state):
+        lower = np.broadcast_to(min_calories, remaining.shape)
+        shape = (len(users), DRAWS)
+        candidates = self.index.select_many(np.broadcast_to(remaining[:, None], shape),
+                                            np.broadcast_to(lower[:, None], shape), min_protein, rng)
+        usable = self._usable(users, candidates, state)
+        hit = usable.any(axis=1)
+        chosen = np.where(hit, candidates[np.arange(len(users)), usable.argmax(axis=1)], -1)
+
+        # every draw was blocked: look through the user's whole range
+        for position in np.flatnonzero(~hit & (candidates[:, 0] >= 0)):
+            user = users[position:position + 1]
+            row = self.index.select_usable(lambda rows: self._usable(user, rows[None], state)[0],
+                                           remaining[position], lower[position], min_protein, rng)
+            if row is not None:
+                chosen[position] = row
+        return chosen
+
+    def _pick(self, users, remaining, min_calories, min_protein, rng, state):
+        chosen = self._draw(users, remaining, min_calories, min_protein, rng, state)
+
+        # relax the protein requirement for users with no qualifying meal, as select_meal does
+        missing = np.flatnonzero(chosen < 0)
+        if len(missing):
+            chosen[missing] = self._draw(users[missing], remaining[missing], -np.inf, -np.inf, rng, state)
+        return chosen
+
+    def _take(self, users, slot, chosen, state, calories, protein):
+        day, window, recent, picks, _ = state
+        found = chosen >= 0
+        users, chosen = users[found], chosen[found]
+        picks[users, day, slot] = chosen
+        recent[users, day % window, slot] = self.item_codes[chosen]
+        calories[users, day] += self.index.calories[chosen]
+        protein[users, day] += self.index.protein[chosen]
+        return found
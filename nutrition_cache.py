@@ -0,0 +1,60 @@
+import hashlib
+import re
+import sqlite3
+import time
+
+
+def normalize(text):
+    # case, surrounding space and runs of whitespace don't change what a dish is
+    return re.sub(r'\s+', ' ', (text or '')).strip().lower()
+
+
+def item_key(name, description, model):
+    """
+    Content address of a menu item: a hash of the normalized name and
+    description plus the model that produced the estimate.
+    """
+    content = '\0'.join([model, normalize(name), normalize(description)])
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class NutritionCache:
+    """
+    SQLite store of nutrition estimates keyed by `item_key`, so an item that
+    was already enriched (on an earlier run, under another restaurant or
+    another cuisine) is never sent to the API again.
+    """
+
+    def __init__(self, path='.nutrition_cache.sqlite'):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS nutrition ("
+            " key TEXT PRIMARY KEY, model TEXT, name TEXT, description TEXT,"
+            " calories TEXT, protein TEXT, fat TEXT, carbs TEXT, created REAL)"
+        )
+        self.connection.commit()
+
+    def get(self, key):
+        row = self.connection.execute(
+            "SELECT calories, protein, fat, carbs FROM nutrition WHERE key = ?", (key,)
+        ).fetchone()
+        return list(row) if row else None
+
+    def put_many(self, entries, model):
+        """
+        Store estimates given as (key, (name, description), nutrition_info)
+        tuples.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO nutrition VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(key, model, name, description, *info, now) for key, (name, description), info in entries]
+        )
+        self.connection.commit()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM nutrition").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,138 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import metrics
+
+# Deliveroo's hashed CSS class names, kept in one place so a site redesign is a one-line fix
+SELECTORS = {
+    'restaurant_card': ('a', "HomeFeedUICard-3e299003014c14f9"),
+    'restaurant_name': ('p', "ccl-649204f2a8e630fd ccl-a396bc55704a9c8a ccl-ff5caa8a6f2b96d0 ccl-40ad99f7b47f3781"),
+    'menu_item_card': ('div', "MenuItemCard-03b1bfbfe7cb723c MenuItemCard-3217cba068edacdb"),
+    'item_name': ('p', "ccl-649204f2a8e630fd ccl-a396bc55704a9c8a ccl-0956b2f88e605eb8 ccl-ff5caa8a6f2b96d0 ccl-40ad99f7b47f3781"),
+    'item_description': ('span', "ccl-649204f2a8e630fd ccl-6f43f9bb8ff2d712 ccl-08c109442f3e666d"),
+    'item_price': ('span', "ccl-649204f2a8e630fd ccl-6f43f9bb8ff2d712 ccl-32ec9a3197735a65 ccl-08c109442f3e666d"),
+}
+
+try:
+    import lxml  # noqa: F401
+    HAVE_LXML = True
+except ImportError:
+    HAVE_LXML = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+    HAVE_SELECTOLAX = True
+except ImportError:
+    HAVE_SELECTOLAX = False
+
+
+def css(name):
+    tag, classes = SELECTORS[name]
+    return tag + ''.join('.' + cls for cls in classes.split())
+
+
+def available_backends():
+    backends = ['bs4', 'strained']
+    if HAVE_SELECTOLAX:
+        backends.append('selectolax')
+    return backends
+
+
+def default_backend():
+    return 'selectolax' if HAVE_SELECTOLAX else 'strained'
+
+
+def _soup(html, strain=None):
+    # 'strained' only builds the subtrees we read, with lxml's tree builder when it is installed
+    if strain is None:
+        return BeautifulSoup(html, 'html.parser')
+    tag, classes = SELECTORS[strain]
+    return BeautifulSoup(html, 'lxml' if HAVE_LXML else 'html.parser',
+                         parse_only=SoupStrainer(tag, class_=classes))
+
+
+def _find_text(node, name):
+    tag, classes = SELECTORS[name]
+    found = node.find(tag, class_=classes)
+    return found.get_text() if found else None
+
+
+def parse_listing_html(html, backend='bs4'):
+    """
+    Return a (name, href) pair for every restaurant card on a listing
+    page, in page order. `name` is None for cards without a name tag.
+    """
+    if backend == 'selectolax':
+        restaurants = []
+        for card in HTMLParser(html).css(css('restaurant_card')):
+            name = card.css_first(css('restaurant_name'))
+            restaurants.append((name.text() if name is not None else None, card.attributes.get('href')))
+        return restaurants
+
+    tag, classes = SELECTORS['restaurant_card']
+    soup = _soup(html, 'restaurant_card' if backend == 'strained' else None)
+    return [(_find_text(card, 'restaurant_name'), card['href']) for card in soup.find_all(tag, class_=classes)]
+
+
+def parse_menu_html(html, backend='bs4'):
+    """
+    Return the number of menu item cards on a restaurant page and the
+    name/description/price dict of every complete card, in page order.
+    """
+    items = []
+    if backend == 'selectolax':
+        cards = HTMLParser(html).css(css('menu_item_card'))
+        for card in cards:
+            name = card.css_first(css('item_name'))
+            description = card.css_first(css('item_description'))
+            price = card.css_first(css('item_price'))
+            if name is not None and description is not None and price is not None:
+                items.append({"name": name.text(), "description": description.text(), "price": price.text()})
+        return len(cards), items
+
+    tag, classes = SELECTORS['menu_item_card']
+    soup = _soup(html, 'menu_item_card' if backend == 'strained' else None)
+    cards = soup.find_all(tag, class_=classes)
+    for card in cards:
+        name = _find_text(card, 'item_name')
+        description = _find_text(card, 'item_description')
+        price = _find_text(card, 'item_price')
+        if name is not None and description is not None and price is not None:
+            items.append({"name": name, "description": description, "price": price})
+    return len(cards), items
+
+
+class PageParser:
+    """
+    Parses listing and menu pages with the chosen backend. With
+    `processes` > 0 the parsing runs in a process pool, so the crawl's
+    fetch threads keep the network busy while pages are being parsed.
+    """
+
+    def __init__(self, backend=None, processes=0):
+        self.backend = backend or default_backend()
+        if self.backend not in available_backends():
+            raise ValueError(f"Unknown or unavailable parser backend: {self.backend}")
+        self.pool = ProcessPoolExecutor(max_workers=processes) if processes > 0 else None
+
+    def _run(self, parse, html, kind):
+        # with a pool this includes pickling and queueing, which is what the crawl actually waits for
+        with metrics.timer('parse_seconds', kind=kind, backend=self.backend):
+            if self.pool is None:
+                result = parse(html, self.backend)
+            else:
+                result = self.pool.submit(parse, html, self.backend).result()
+        metrics.inc('pages_parsed_total', kind=kind, backend=self.backend)
+        metrics.inc('parsed_bytes_total', len(html), kind=kind, backend=self.backend)
+        return result
+
+    def listing(self, html):
+        return self._run(parse_listing_html, html, 'listing')
+
+    def menu(self, html):
+        return self._run(parse_menu_html, html, 'menu')
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
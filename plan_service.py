@@ -0,0 +1,349 @@
+"""
+Resident meal-plan service.
+
+Loads and indexes the catalogue once and answers plan requests over HTTP,
+so a plan costs milliseconds instead of a fresh Python process that
+imports pandas and re-reads the CSV. The catalogue is reloaded in the
+background when the enriched CSV (or its compiled copy) changes.
+
+Work is cached per requirement bucket: calories and protein rounded to
+--calorie-bucket and --protein-bucket, plus the goal and solver settings.
+For the random planner a bucket holds its candidate meals (the index
+without the items above the bucket's calorie ceiling), and every request
+draws a fresh plan from them for the user's own target. For --solver
+optimal it holds the solved plan.
+
+    python plan_service.py --port 8080
+    curl -s localhost:8080/plan -d '{"name": "Bob", "age": 30, "weight": 80, "height": 180, "gender": "male", "goal": 1}'
+"""
+import argparse
+import json
+import math
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+import metrics
+from batch_plan import GOALS, PROFILE_LIMITS
+from catalogue import PLAN_COLUMNS, compiled_path, load_catalogue
+from meal_index import MealIndex
+from meal_plan import calculate_requirements, generate_meal_plan, solve_meal_plan
+from meal_solver import MealSolver
+
+class LRUCache:
+    """Thread-safe least-recently-used mapping with hit/miss counters."""
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self._lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def summary(self):
+        with self._lock:
+            return {'entries': len(self.entries), 'size': self.size, 'hits': self.hits, 'misses': self.misses}
+
+
+class Snapshot:
+    """One loaded catalogue with its index, solver and plan cache."""
+
+    def __init__(self, catalogue_path, cache_size):
+        # taken before loading: a file replaced mid-load then differs from it, and the watcher loads again
+        self.signature = catalogue_signature(catalogue_path)
+        self.meal_data = load_catalogue(catalogue_path, PLAN_COLUMNS).reset_index(drop=True)
+        self.index = MealIndex(self.meal_data)
+        self._solver = None
+        self._solver_lock = threading.Lock()
+        self.cache = LRUCache(cache_size)
+        self.loaded_at = time.time()
+
+    @property
+    def solver(self):
+        with self._solver_lock:
+            if self._solver is None:
+                self._solver = MealSolver(self.meal_data)
+            return self._solver
+
+
+def catalogue_signature(catalogue_path):
+    # the CSV and the compiled copy's metadata; either changing means a reload
+    signature = []
+    for path in [catalogue_path, os.path.join(compiled_path(catalogue_path), 'meta.json')]:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            signature.append(None)
+    return signature
+
+
+def validate_profile(profile):
+    """
+    Check a request body with the same rules as the prompts in
+    meal_plan.main and return the normalized fields, or raise ValueError.
+    """
+    name = str(profile.get('name', '')).strip()
+    if not name or not all(part.isalpha() for part in name.split()):
+        raise ValueError("name must contain only letters and spaces")
+    try:
+        age = float(profile['age'])
+        weight = float(profile['weight'])
+        height = float(profile['height'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError("age, weight and height must be numbers")
+    for field, value in [('age', age), ('weight', weight), ('height', height)]:
+        # the solver's tables grow with the calorie target, so absurd sizes are refused here
+        if not (math.isfinite(value) and 0 < value <= PROFILE_LIMITS[field]):
+            raise ValueError(f"{field} must be a positive number up to {PROFILE_LIMITS[field]}")
+    if not age.is_integer():
+        raise ValueError("age must be a whole number")
+    age = int(age)
+    gender = str(profile.get('gender', '')).lower()
+    if gender not in ['male', 'female']:
+        raise ValueError("gender must be 'male' or 'female'")
+    goal = profile.get('goal')
+    if isinstance(goal, str) and not goal.strip().isdigit():
+        goal = goal.strip().lower()
+    else:
+        try:
+            goal = GOALS.get(int(goal))
+        except (TypeError, ValueError):
+            goal = None
+    if goal not in GOALS.values():
+        raise ValueError("goal must be 1, 2, 3 or one of: " + ", ".join(GOALS.values()))
+    return name, age, weight, height, gender, goal
+
+
+def plan_settings(profile):
+    solver = profile.get('solver', 'greedy')
+    if solver not in ('greedy', 'optimal'):
+        raise ValueError("solver must be 'greedy' or 'optimal'")
+    try:
+        tolerance = float(profile.get('tolerance', 0.1))
+        max_fat = None if profile.get('max_fat') is None else float(profile['max_fat'])
+        max_carbs = None if profile.get('max_carbs') is None else float(profile['max_carbs'])
+    except (TypeError, ValueError):
+        raise ValueError("tolerance, max_fat and max_carbs must be numbers")
+    if not (math.isfinite(tolerance) and 0 <= tolerance <= 1):
+        raise ValueError("tolerance must be between 0 and 1")
+    for limit in (max_fat, max_carbs):
+        if limit is not None and not (math.isfinite(limit) and limit > 0):
+            raise ValueError("max_fat and max_carbs must be positive numbers")
+    return solver, tolerance, max_fat, max_carbs
+
+
+def meal_json(meal):
+    link = meal.get('Link')
+    return {'Menu Item': str(meal['Menu Item']), 'Restaurant Name': str(meal['Restaurant Name']),
+            'Calories': float(meal['Calories']), 'Protein (g)': float(meal['Protein (g)']),
+            'Link': link if isinstance(link, str) and link else None}
+
+
+def plan_json(selected, calories, protein):
+    return ({meal_type: [meal_json(meal) for meal in meals] for meal_type, meals in selected.items()},
+            float(calories), float(protein))
+
+
+class PlanService:
+    """
+    Plans requests against the current Snapshot and swaps in a new one
+    when the catalogue changes.
+    """
+
+    def __init__(self, catalogue_path, cache_size=4096, calorie_bucket=50, protein_bucket=5, reload_interval=2.0):
+        self.catalogue_path = catalogue_path
+        self.cache_size = cache_size
+        self.calorie_bucket = calorie_bucket
+        self.protein_bucket = protein_bucket
+        self.reload_interval = reload_interval
+        self.snapshot = Snapshot(catalogue_path, cache_size)
+        self.reloads = 0
+        self._stop = threading.Event()
+
+    def watch(self):
+        thread = threading.Thread(target=self._watch, daemon=True)
+        thread.start()
+        return thread
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            if catalogue_signature(self.catalogue_path) == self.snapshot.signature:
+                continue
+            try:
+                snapshot = Snapshot(self.catalogue_path, self.cache_size)
+            except Exception as error:
+                # keep serving the previous catalogue (e.g. while the CSV is still being written)
+                print(f"Catalogue reload failed, keeping the loaded one: {error}")
+                continue
+            # requests already running keep the snapshot they started with
+            self.snapshot = snapshot
+            self.reloads += 1
+            metrics.inc('catalogue_reloads_total')
+            print(f"Reloaded {len(snapshot.meal_data)} items from {self.catalogue_path}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _bucket(self, total_calories, protein_requirement, goal, settings):
+        return (round(total_calories / self.calorie_bucket), round(protein_requirement / self.protein_bucket), goal, settings)
+
+    def plan(self, profile):
+        """Plan one request body and return the JSON-ready response."""
+        name, age, weight, height, gender, goal = validate_profile(profile)
+        settings = plan_settings(profile)
+
+        total_calories, protein_requirement = calculate_requirements(weight, height, age, gender, goal)
+        snapshot = self.snapshot
+        key = self._bucket(total_calories, protein_requirement, goal, settings)
+        candidates = snapshot.cache.get(key)
+        cached = candidates is not None
+        metrics.inc('plan_cache_lookups_total', result='hit' if cached else 'miss')
+        if not cached:
+            candidates = self._candidates(snapshot, key, goal, settings)
+            snapshot.cache.put(key, candidates)
+        if settings[0] == 'optimal':
+            meals, total_calories_consumed, total_protein_consumed = candidates
+        else:
+            meals, total_calories_consumed, total_protein_consumed = plan_json(*generate_meal_plan(
+                total_calories, protein_requirement, goal, candidates, np.random.default_rng()))
+
+        calorie_diff = total_calories_consumed - total_calories
+        return {
+            'name': name,
+            'age': age, 'weight': weight, 'height': height, 'gender': gender, 'goal': goal,
+            'calorie_requirement': round(total_calories, 2),
+            'protein_requirement': round(protein_requirement, 2),
+            'meal_plan': meals,
+            'total_calories': round(total_calories_consumed, 2),
+            'total_protein': round(total_protein_consumed, 2),
+            'calorie_diff': round(calorie_diff, 2),
+            'calorie_percent_diff': round(abs(calorie_diff) / total_calories * 100, 1),
+            'protein_diff': round(total_protein_consumed - protein_requirement, 2),
+            'cached': cached,
+        }
+
+    def _candidates(self, snapshot, key, goal, settings):
+        solver, tolerance, max_fat, max_carbs = settings
+        if solver != 'optimal':
+            # no plan in the bucket goes above its calorie ceiling, so nothing above it is a candidate
+            return snapshot.index.restrict((key[0] + 0.5) * self.calorie_bucket)
+        # solve for the middle of the bucket so every user in it gets a plan that fits them
+        total_calories = key[0] * self.calorie_bucket
+        protein_requirement = key[1] * self.protein_bucket
+        return plan_json(*solve_meal_plan(total_calories, protein_requirement, goal, snapshot.solver, tolerance,
+                                          max_fat, max_carbs))
+
+    def health(self):
+        snapshot = self.snapshot
+        return {'items': len(snapshot.meal_data), 'loaded_at': snapshot.loaded_at, 'reloads': self.reloads,
+                'cache': snapshot.cache.summary()}
+
+
+class PlanServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        super().__init__(address, PlanHandler)
+        self.service = service
+
+
+class PlanHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out as separate writes; without this each response waits on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, content_type='application/json'):
+        body = payload.encode('utf-8') if isinstance(payload, str) else json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send(200, self.server.service.health())
+        elif self.path == '/metrics':
+            self._send(200, metrics.REGISTRY.prometheus(), 'text/plain; version=0.0.4')
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        status = 200
+        try:
+            length = self.headers.get('Content-Length', '0')
+            if not length.isdigit():
+                # without a length the body can't be told apart from a next request, so the connection is closed
+                self.close_connection = True
+                raise ValueError("Content-Length must be a non-negative whole number")
+            body = self.rfile.read(int(length))
+            if self.path != '/plan':
+                self._send(404, {'error': 'not found'})
+                return
+            profile = json.loads(body)
+            if not isinstance(profile, dict):
+                raise ValueError("request body must be a JSON object")
+            self._send(200, self.server.service.plan(profile))
+        except ValueError as error:
+            status = 400
+            self._send(400, {'error': str(error)})
+        except Exception:
+            # a bug in planning still gets an answer, and the thread lives on for the next request
+            status = 500
+            traceback.print_exc()
+            self._send(500, {'error': 'internal error'})
+        metrics.observe('service_request_seconds', time.perf_counter() - start, endpoint='/plan', status=status)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve meal plans over HTTP from a resident, indexed catalogue.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--catalogue", default="restaurants_sample_with_nutrition.csv")
+    parser.add_argument("--cache-size", type=int, default=4096, help="requirement buckets kept in the plan cache")
+    parser.add_argument("--calorie-bucket", type=float, default=50, help="calorie rounding for the plan cache")
+    parser.add_argument("--protein-bucket", type=float, default=5, help="protein rounding for the plan cache")
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="seconds between catalogue change checks")
+    args = parser.parse_args(argv)
+
+    service = PlanService(args.catalogue, args.cache_size, args.calorie_bucket, args.protein_bucket, args.reload_interval)
+    service.watch()
+    server = PlanServer((args.host, args.port), service)
+    print(f"Serving meal plans for {len(service.snapshot.meal_data)} items on http://{args.host}:{args.port}/plan")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
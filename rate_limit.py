@@ -0,0 +1,71 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `per_minute` tokens per minute, up
+    to `per_minute` tokens. `acquire(n)` blocks until `n` tokens are free.
+    A request bigger than the whole bucket is let through once the bucket
+    is full, so oversized batches still make progress.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, n=1):
+        n = min(n, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= n:
+                    self.tokens -= n
+                    return
+                wait = (n - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, n):
+        # settling up once the real cost of a request is known (n may be negative)
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - n)
+
+
+def backoff_delay(attempt, base=1.0, cap=60.0, retry_after=None):
+    """
+    Exponential backoff with full jitter for the given attempt (0-based).
+    A server-supplied Retry-After value is treated as a lower bound.
+    """
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def retry_after_seconds(error):
+    """
+    Read Retry-After (or OpenAI's retry-after-ms) from an API error's HTTP
+    response, if it has one.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms') is not None:
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after') is not None:
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
@@ -0,0 +1,125 @@
+"""
+End-to-end crawls against benchmarks/fixture_server.py on a free port:
+worker counts must not change the output, the sharded crawl must keep one
+area's listings at every geohash while writing each restaurant once, and a
+crawl killed part way and finished with --resume must write what a clean
+crawl writes.
+"""
+import csv
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'benchmarks')]
+
+import main  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+
+
+@pytest.fixture
+def base_url():
+    server = FixtureServer(('127.0.0.1', 0), latency=0.01, listing_pages=2)
+    url = server.start()
+    yield url
+    server.shutdown()
+    server.server_close()
+
+
+def crawl_args(base_url, directory, *extra):
+    os.makedirs(directory, exist_ok=True)
+    return ['--base-url', base_url, '--rate', '0', '--per-listing', '4',
+            '--output', os.path.join(directory, 'restaurants.csv'),
+            '--delta-output', os.path.join(directory, 'delta.csv'),
+            '--state-dir', os.path.join(directory, 'state'), *extra]
+
+
+def read_outputs(directory):
+    outputs = {}
+    for name in ['restaurants.csv', 'delta.csv', os.path.join('state', 'restaurants.json')]:
+        with open(os.path.join(directory, name), encoding='utf-8') as file:
+            outputs[name] = file.read()
+    return outputs
+
+
+def test_worker_count_does_not_change_output(base_url, tmp_path):
+    one, eight = str(tmp_path / 'one'), str(tmp_path / 'eight')
+    main.main(crawl_args(base_url, one, '--workers', '1'))
+    main.main(crawl_args(base_url, eight, '--workers', '8', '--per-host', '8'))
+    assert read_outputs(one) == read_outputs(eight)
+
+
+def read_rows(directory):
+    with open(os.path.join(directory, 'restaurants.csv'), newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+def test_areas_keep_every_geohash_and_merge_restaurants(base_url, tmp_path):
+    both, one = str(tmp_path / 'both'), str(tmp_path / 'one')
+    queue = os.path.join(both, 'queue.sqlite')
+    main.main(crawl_args(base_url, both, '--areas', 'dubai/marina:thrr', 'dubai/marina:thrq',
+                         '--max-pages', '2', '--queue', queue))
+    main.main(crawl_args(base_url, one, '--areas', 'dubai/marina:thrr', '--max-pages', '2'))
+
+    with sqlite3.connect(queue) as connection:
+        listings = dict(connection.execute(
+            "SELECT geohash, COUNT(*) FROM listings WHERE area = 'dubai/marina' GROUP BY geohash"))
+        restaurants = connection.execute("SELECT COUNT(DISTINCT restaurant) FROM listings").fetchone()[0]
+    assert set(listings) == {'thrr', 'thrq'}
+    assert listings['thrr'] == listings['thrq'] > 0
+
+    # both geohashes list the same restaurants, so each is written once, as with a single seed
+    rows = read_rows(both)
+    assert len({row['Restaurant ID'] for row in rows}) == restaurants
+    assert len(rows) == len(read_rows(one))
+
+
+def kill_part_way(argv, progress):
+    crawl = subprocess.Popen([sys.executable, os.path.join(ROOT, 'main.py'), *argv], cwd=ROOT,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while not progress() and crawl.poll() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert crawl.poll() is None, "the crawl finished before it could be killed"
+    crawl.send_signal(signal.SIGKILL)
+    crawl.wait()
+
+
+def journal_lines(path):
+    try:
+        with open(path, encoding='utf-8') as file:
+            return sum(1 for _ in file)
+    except FileNotFoundError:
+        return 0
+
+
+def finished_units(path):
+    try:
+        with sqlite3.connect(path) as connection:
+            return connection.execute("SELECT COUNT(*) FROM units WHERE state = 'done'").fetchone()[0]
+    except sqlite3.OperationalError:
+        return 0
+
+
+@pytest.mark.parametrize('sharded', [False, True], ids=['single', 'sharded'])
+def test_killed_crawl_resumes_to_the_clean_output(base_url, tmp_path, sharded):
+    clean, killed = str(tmp_path / 'clean'), str(tmp_path / 'killed')
+    extra = ['--areas', 'dubai/marina:thrr', 'dubai/jlt', '--max-pages', '2'] if sharded else []
+    main.main(crawl_args(base_url, clean, *extra))
+
+    argv = crawl_args(base_url, killed, *extra)
+    if sharded:
+        queue = os.path.join(killed, 'state', 'queue.sqlite')
+        kill_part_way(argv, lambda: finished_units(queue) >= 20)
+    else:
+        journal = os.path.join(killed, 'restaurants.csv.checkpoint')
+        kill_part_way(argv, lambda: journal_lines(journal) >= 8)
+    assert not os.path.exists(os.path.join(killed, 'restaurants.csv'))
+
+    main.main(argv + ['--resume'])
+    assert read_outputs(killed) == read_outputs(clean)